@@ -2,14 +2,31 @@ import sys
 from datetime import datetime
 
 from PySide6 import QtWidgets
+from PySide6 import QtCore
+from PySide6 import QtGui
 
 from task_list import *
 from task import *
 from task_edit import *
+from task_store import TaskStore
+from lazy_tasks import LazyTaskList
+from overdue import *
+from history import *
+from task_map import TaskMap
+from task_changes import TaskChangeNotifier
 from utils import *
+from tracing import traced
 
 # main application class
 class HomeworkOrganiser(QtWidgets.QWidget):
+    # signals emitted after a task has been changed, used to record changes to the open task file
+    # ! tasks whose fields are changed together are sent in one list, so they can be written in one transaction
+    task_added = QtCore.Signal(Task)
+    tasks_changed = QtCore.Signal(list)
+    task_removed = QtCore.Signal(Task)
+    # emitted when an edit is recorded, undone or redone, used to enable the undo and redo actions
+    history_changed = QtCore.Signal()
+
     def __init__(self, tasks: list[Task]):
         super().__init__()
 
@@ -19,9 +36,13 @@ class HomeworkOrganiser(QtWidgets.QWidget):
         self.setLayout(self.main_layout)
 
         self.tasks = tasks
+        # finds tasks by the ids sent by the task list and edit form
+        self.task_map = TaskMap()
+        self.task_map.set_tasks(tasks)
 
         # create task view and add it to the app
         self.task_view = TaskView(self.tasks, self.set_selected_task)
+        self.task_view.task_list.selection_changed.connect(self.selection_changed)
         self.task_view_container = QtWidgets.QWidget()
         self.task_view_container.setLayout(self.task_view)
         self.main_layout.addWidget(self.task_view_container, stretch=1)
@@ -31,41 +52,319 @@ class HomeworkOrganiser(QtWidgets.QWidget):
         self.seperator_line = SeperatorLine(True)
         self.main_layout.addWidget(self.seperator_line, stretch=1)
 
-        # create the edit view and add it to the app
-        self.edit_view = TaskEdit()
+        # add the container for the edit view to the app
+        # ! the edit view is created after the window is first painted, so the task list is shown sooner (see get_edit_view)
+        self.edit_view: TaskEdit | None = None
         self.edit_view_container = QtWidgets.QWidget()
-        self.edit_view_container.setLayout(self.edit_view)
-        self.edit_view.updated.connect(self.task_updated)
-        self.edit_view.created.connect(self.task_created)
-        self.edit_view.deleted.connect(self.task_deleted)
         self.main_layout.addWidget(self.edit_view_container, stretch=2)
 
+        # tracks which tasks are overdue, the task list draws their due dates in red
+        self.overdue_scheduler = OverdueScheduler(self.tasks)
+        self.overdue_scheduler.task_became_overdue.connect(self.task_overdue)
+        self.task_view.task_list.overdue_tasks = self.overdue_scheduler.overdue
+        self.task_added.connect(self.overdue_scheduler.update_task)
+        self.tasks_changed.connect(self.overdue_scheduler.update_tasks)
+        self.task_removed.connect(self.overdue_scheduler.remove_task)
+
+        # records each edit so it can be undone
+        # ! task databases write changes as they are made and don't keep tasks in memory, so edits to them aren't recorded
+        self.history = UndoHistory()
+        # False while undo or redo are changing tasks, so their changes aren't recorded as a new edit
+        self.recording_history = True
+
+        # reports the changes made to tasks' fields once per turn of the event loop
+        # ! changes from the edit form, the task list's checkboxes, bulk actions and undo and redo are all handled by fields_changed
+        self.change_notifier = TaskChangeNotifier()
+        self.change_notifier.tasks_changed.connect(self.fields_changed)
+
+    # returns the edit view, creating it if it hasn't been created yet
+    def get_edit_view(self) -> TaskEdit:
+        if self.edit_view is None:
+            self.edit_view = TaskEdit()
+            self.edit_view_container.setLayout(self.edit_view)
+            self.edit_view.created.connect(self.task_created)
+            self.edit_view.deleted.connect(self.task_deleted)
+
+        return self.edit_view
+
+    # creates the edit view once the window has been painted for the first time
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        if self.edit_view is None:
+            QtCore.QTimer.singleShot(0, self.get_edit_view)
+
+        super().paintEvent(event)
+
+    # returns the task with an id, or None if it is no longer in the task list
+    def get_task(self, task_id: int) -> Task | None:
+        # task databases only keep the tasks that are in use, so they keep their own map of ids to tasks
+        if isinstance(self.tasks, TaskStore):
+            return self.tasks.find(task_id)
+
+        return self.task_map.get(task_id)
+
+    # returns the task with an id and its index in the task list, or None if it is no longer in the task list
+    # ! the task is found by its id, so this is still the right task if the list was sorted or tasks were removed since it was selected
+    def locate_task(self, task_id: int) -> tuple[Task, int] | None:
+        task = self.get_task(task_id)
+        if task is None:
+            return None
+
+        index = self.task_view.index_of(task)
+        if index is None:
+            return None
+
+        return (task, index)
+
     # callback for when a task is selected in the task list
-    def set_selected_task(self, index):
-        self.edit_view.set_selected_task(self.tasks[index], index)
-    
-    # callback for when a task is updated in the task edit form
-    def task_updated(self):
-        self.task_view.redraw_list()
+    @traced
+    def set_selected_task(self, task_id: int):
+        task = self.get_task(task_id)
+
+        # ? existence check: the task may have been removed by a task database
+        if not task is None:
+            self.get_edit_view().set_selected_task(task)
     
+    # callback for a batch of changes to tasks' fields (see task_changes.py)
+    # each changed task is re-indexed, repainted and recorded once, however many of its fields were changed
+    # all the changes in the batch are undone together
+    @traced
+    def fields_changed(self, batch: dict[Task, dict]):
+        # ? existence check: the task isn't in the task list, e.g. it was removed by undo while it was being edited
+        batch = {task: fields for task, fields in batch.items() if self.get_task(task.id) is task}
+        if len(batch) == 0:
+            return
+
+        # ! the changes are reported first, so task databases have written them (see menu.py) before the task list finds where the tasks are
+        self.tasks_changed.emit(list(batch))
+        self.task_view.refresh_tasks(batch.keys())
+
+        if self.recording_history and self.is_history_enabled():
+            self.history.record_fields([
+                FieldChange(task, None, field, old, getattr(task, field))
+                for task, fields in batch.items()
+                for field, old in fields.items()
+            ])
+            self.history_changed.emit()
+
+    # the functions below change which tasks are in the task list
+    # ! the pending changes are reported first, so they are recorded before the task is added or removed
+
     # callback for when a task is created in the task edit form
+    # the task view adds the task to the end of the task list
+    # ! task databases give the task its id when it is inserted
+    @traced
     def task_created(self, task: Task):
-        print("task created")
-        self.tasks.append(task)
-        self.task_view.redraw_list()
+        self.change_notifier.flush()
+
+        if not isinstance(self.tasks, TaskStore):
+            self.task_map.add(task)
+
+        index = self.task_view.add_task(task)
+        self.task_added.emit(task)
+
+        if self.is_history_enabled():
+            self.history.record_insert(task, index)
+            self.history_changed.emit()
     
     # callback for when a task is deleted in the edit form
-    def task_deleted(self, index: int):
-        print("task deleted")
-        del self.tasks[index]
-        self.task_view.redraw_list()
+    # the task view removes the task from the task list
+    @traced
+    def task_deleted(self, task_id: int):
+        self.change_notifier.flush()
+        found = self.locate_task(task_id)
+
+        # ? existence check
+        if found is None:
+            return
+        task, index = found
+
+        self.task_view.remove_task(index)
+        self.task_map.remove(task)
+        self.task_removed.emit(task)
+
+        if self.is_history_enabled():
+            self.history.record_delete(task, index)
+            self.history_changed.emit()
+
+    # callback for when tasks are selected or unselected in the task list
+    # the edit form can only edit one task, so it is cleared once several tasks are selected
+    def selection_changed(self, count: int):
+        if count > 1 and not self.edit_view is None:
+            self.edit_view.clear_selected_task()
+
+    # the functions below change every task selected in the task list as a single action
+    # ! the tasks are changed together, so the task list, indexes and open file are updated once and the action is undone in one step
+    @traced
+    def complete_selected(self):
+        for task in self.task_view.task_list.get_selected_tasks():
+            task.complete_task()
+
+        self.change_notifier.flush()
+
+    @traced
+    def set_selected_priority(self, priority: TaskPriority):
+        for task in self.task_view.task_list.get_selected_tasks():
+            task.set_priority(priority)
+
+        self.change_notifier.flush()
+
+    # asks for the class to move the selected tasks to
+    @traced
+    def set_selected_class(self):
+        class_name, accepted = QtWidgets.QInputDialog.getText(self, "Set Class", "Class:")
+
+        # ? existence check: the dialog was cancelled or no class was entered
+        if not accepted or class_name == "":
+            return
+
+        for task in self.task_view.task_list.get_selected_tasks():
+            task.set_class(class_name)
+
+        self.change_notifier.flush()
+
+    # the selected tasks are removed from the task list in one update
+    @traced
+    def delete_selected(self):
+        self.change_notifier.flush()
+
+        indexes = self.task_view.indexes_of(self.task_view.task_list.selected_tasks)
+
+        # ? existence check: no tasks are selected
+        if len(indexes) == 0:
+            return
+
+        removed = [self.tasks[index] for index in indexes]
+        self.task_view.remove_tasks(indexes)
+
+        for task in removed:
+            self.task_map.remove(task)
+            self.task_removed.emit(task)
+
+        if self.is_history_enabled():
+            # the tasks are recorded as if the last task was removed first, so undo puts each task back at its index in order
+            self.history.record([DeleteChange(task, index) for index, task in reversed(list(zip(indexes, removed)))])
+            self.history_changed.emit()
+
+        # ? existence check: the edit form is showing one of the removed tasks
+        if not self.edit_view is None and self.edit_view.selected_task in removed:
+            self.edit_view.clear_selected_task()
+
+    def is_history_enabled(self) -> bool:
+        return not isinstance(self.tasks, TaskStore)
+
+    # callbacks for the undo and redo actions
+    # the changes of an edit are reverted in the reverse order they were made
+    @traced
+    def undo(self):
+        self.change_notifier.flush()
+        edit = self.history.undo()
+
+        # ? existence check: there is nothing to undo
+        if edit is None:
+            return
+
+        for change in reversed(edit.changes):
+            self.apply_change(change, True)
+
+        self.finish_history_change()
+
+    @traced
+    def redo(self):
+        self.change_notifier.flush()
+        edit = self.history.redo()
+
+        # ? existence check: there is nothing to redo
+        if edit is None:
+            return
+
+        for change in edit.changes:
+            self.apply_change(change, False)
+
+        self.finish_history_change()
+
+    # reverts a change if undo is True, otherwise makes the change again
+    # the same signals are emitted as when the change was first made, so the open file and overdue tasks are updated
+    # ! changes to fields are reported by the tasks, see finish_history_change
+    def apply_change(self, change, undo: bool):
+        # inserting a task is undone by deleting it, and deleting a task is undone by inserting it
+        if isinstance(change, DeleteChange):
+            insert = undo
+        elif isinstance(change, InsertChange):
+            insert = not undo
+        else:
+            insert = None
+
+        if insert:
+            # the task is put back where it was, or at the end if the list has become shorter since
+            index = min(change.index, len(self.tasks))
+            self.task_map.add(change.task)
+            change.index = self.task_view.insert_task(index, change.task)
+            self.task_added.emit(change.task)
+            return
+
+        if insert is None:
+            # ? existence check: the task has been removed from the list since the change was made
+            # ! the task is found by its id, as edits to many tasks would otherwise search the list once for each change
+            if self.get_task(change.task.id) is change.task:
+                change.task.set_field(change.field, change.old if undo else change.new)
+            return
+
+        index = find_task(self.tasks, change.task, change.index)
+
+        # ? existence check: the task has been removed from the list since the change was made
+        if index is None:
+            return
+        change.index = index
+
+        self.task_view.remove_task(index)
+        self.task_map.remove(change.task)
+        self.task_removed.emit(change.task)
+
+    # the changed fields are reported straight away, without being recorded as a new edit
+    # the edit form may show a task that has moved or was removed, so it is cleared after undoing or redoing
+    def finish_history_change(self):
+        self.recording_history = False
+        self.change_notifier.flush()
+        self.recording_history = True
+
+        if not self.edit_view is None:
+            self.edit_view.clear_selected_task()
+
+        self.history_changed.emit()
     
     # callback for when new tasks are loaded from a file
-    def on_tasks_loaded(self, tasks: list[Task]):
+    @traced
+    def on_tasks_loaded(self, tasks: list[Task], search_index: SearchIndex | None = None, filter_index: FilterIndex | None = None):
         self.tasks = tasks
 
-        self.task_view.tasks = tasks
-        self.task_view.redraw_list()
+        # ! tasks in indexed files are mapped and tracked once they are decoded, so opening the file doesn't decode every task
+        # task databases aren't kept in memory, so their tasks are tracked once they are read, e.g. when they are shown in the task list
+        # ! the overdue scheduler keeps the incomplete tasks it tracks in memory, so they stay the same Task objects while they are tracked
+        # ! this is done before the task view is given the tasks, as searching or filtering them decodes every task
+        if isinstance(tasks, LazyTaskList):
+            self.task_map.set_tasks([], tasks.task_file.next_id)
+            self.overdue_scheduler.set_tasks([])
+            tasks.decode_callbacks += [self.task_map.add, self.overdue_scheduler.add_task]
+        elif isinstance(tasks, TaskStore):
+            self.task_map.set_tasks([])
+            self.overdue_scheduler.set_tasks([])
+            tasks.decode_callbacks.append(self.overdue_scheduler.add_task)
+        else:
+            self.task_map.set_tasks(tasks)
+            self.overdue_scheduler.set_tasks(tasks)
+
+        self.task_view.set_tasks(tasks, search_index, filter_index)
+
+        # edits to the previous tasks can't be undone
+        self.history.clear()
+        self.history_changed.emit()
 
-        self.edit_view.clear_selected_task()
+        # ? existence check: the edit view has nothing to clear if it hasn't been created yet
+        if not self.edit_view is None:
+            self.edit_view.clear_selected_task()
 
+    # callback for when a task's due date passes
+    # only the visible rows of the task list are repainted
+    @traced
+    def task_overdue(self, task: Task):
+        self.task_view.task_list.viewport().update()
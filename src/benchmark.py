@@ -0,0 +1,370 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# the benchmarks create widgets without showing a window
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6 import QtWidgets
+
+from task import *
+from task_sort import *
+from file_io import *
+from lazy_tasks import *
+from task_list import *
+
+# ? Benchmarks the app with large numbers of tasks, run with: python benchmark.py --output results.json
+# ? Startup time is benchmarked separately, run with: python benchmark.py --startup
+# ? Compressed task files are compared with: python benchmark.py --only save_tasks load_tasks
+# ? Opening version 2 and indexed task files is compared with: python benchmark.py --only first_row
+# ? Data types:
+# ?     - Benchmark: a named operation that is timed for each task count
+# ?     - dict: each result is stored as a dict so the results can be written as JSON and compared between commits
+# ? Data structures:
+# ?     - list[dict]: the results of every benchmark, in the order they were run
+
+# task counts used when no sizes are given
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# the values used to generate synthetic tasks
+SUBJECTS = ["Maths", "English", "Physics", "Chemistry", "Biology", "History", "Geography", "Art", "Music", "Computing", "French", "Economics"]
+TITLE_WORDS = ["Ex", "Essay", "Worksheet", "Reading", "Chapter", "Lab report", "Revision", "Quiz", "Project", "Homework"]
+START_DATE = datetime(2025, 1, 1)
+
+# creates a list of tasks with varied titles, classes, priorities and due dates
+# the same seed always creates the same tasks, so results can be compared between runs
+def generate_tasks(count: int, seed: int = 0) -> list[Task]:
+    rng = random.Random(seed)
+    tasks = []
+
+    for i in range(count):
+        task = Task(
+            f"{rng.choice(TITLE_WORDS)} {rng.randint(1, 20)}.{rng.randint(1, 9)} #{i}",
+            START_DATE + timedelta(days=rng.randint(0, 365), hours=rng.randint(0, 23)),
+            rng.choice(SUBJECTS),
+            PRIORITIES[rng.randint(0, len(PRIORITIES) - 1)]
+        )
+        task.completed = rng.random() < 0.25
+        tasks.append(task)
+
+    return tasks
+
+# an operation that is timed for each task count
+# setup is run before every timed run and returns the arguments passed to run, so setup isn't included in the time
+# the size of the file at file_path is included in the results, used to compare how well each codec compresses task files
+class Benchmark:
+    def __init__(self, name: str, setup, run, file_path: str | None = None):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        self.file_path = file_path
+
+# times a benchmark, using the fastest of several runs
+# the peak memory is measured on a separate run as tracemalloc slows down the code being measured
+# ! tracemalloc only measures memory allocated by python, memory allocated by Qt isn't included
+def measure(benchmark: Benchmark, tasks: list[Task], repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        args = benchmark.setup(tasks)
+        gc.collect()
+
+        start = time.perf_counter()
+        benchmark.run(*args)
+        times.append(time.perf_counter() - start)
+
+    args = benchmark.setup(tasks)
+    gc.collect()
+    tracemalloc.start()
+    benchmark.run(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds = min(times)
+    result = {
+        "benchmark": benchmark.name,
+        "tasks": len(tasks),
+        "seconds": seconds,
+        "tasks_per_second": len(tasks) / seconds if seconds > 0 else None,
+        "peak_memory_bytes": peak_memory,
+    }
+
+    if not benchmark.file_path is None:
+        result["file_size_bytes"] = os.path.getsize(benchmark.file_path)
+
+    return result
+
+# creates the benchmarks, files are written to directory
+def get_benchmarks(directory: str) -> list[Benchmark]:
+    path = os.path.join(directory, "benchmark.tsk")
+
+    def setup_save(tasks):
+        return (path, tasks)
+
+    def setup_load(tasks):
+        save_tasks(path, tasks)
+        return (path,)
+
+    # each codec saves to and loads from its own file, the codec is chosen from the file's extension
+    def setup_codec_save(codec_path: str):
+        return lambda tasks: (codec_path, tasks)
+
+    def setup_codec_load(codec_path: str):
+        def setup(tasks):
+            save_tasks(codec_path, tasks)
+            return (codec_path,)
+        return setup
+
+    # each sort starts from a shuffled copy of the tasks, the copy isn't included in the time
+    def setup_sort(sort_type: SortType):
+        def setup(tasks):
+            view = TaskView([], lambda index: None)
+            view.tasks = random.Random(0).sample(tasks, len(tasks))
+            view.sort_type = sort_type
+            return (view,)
+        return setup
+
+    def setup_populate(tasks):
+        task_list = TaskList([], lambda index: None)
+        task_list.resize(400, 800)
+        task_list.show()
+        QtWidgets.QApplication.processEvents()
+        return (task_list, tasks)
+
+    # includes painting the rows that are visible after the list is populated
+    def populate(task_list: TaskList, tasks: list[Task]):
+        task_list.populate_list(tasks)
+        task_list.repaint()
+
+    # the time from opening a task file to showing its first rows
+    # indexed files only decode the visible tasks, version 2 files decode every task first
+    indexed_path = os.path.join(directory, "benchmark_indexed.tsk")
+    # ! the indexed files opened by the last run are closed before the file is written again, as they are still mapped
+    lazy_lists: list[LazyTaskList] = []
+
+    def setup_first_row(indexed: bool):
+        def setup(tasks):
+            for lazy_list in lazy_lists:
+                lazy_list.close()
+            lazy_lists.clear()
+
+            save_tasks(indexed_path if indexed else path, tasks, indexed=indexed)
+            return (setup_populate(tasks)[0], indexed_path if indexed else path)
+        return setup
+
+    def first_row(task_list: TaskList, file_path: str):
+        populate(task_list, load_tasks(file_path))
+
+    def first_row_indexed(task_list: TaskList, file_path: str):
+        lazy_list = LazyTaskList(IndexedTaskFile(file_path))
+        lazy_lists.append(lazy_list)
+        populate(task_list, lazy_list)
+
+    benchmarks = [
+        Benchmark("save_tasks", setup_save, save_tasks, path),
+        Benchmark("load_tasks", setup_load, load_tasks, path),
+    ]
+    for extension, codec in CODEC_EXTENSIONS.items():
+        if codec in get_available_codecs():
+            codec_path = path + extension
+            benchmarks.append(Benchmark(f"save_tasks[{codec}]", setup_codec_save(codec_path), save_tasks, codec_path))
+            benchmarks.append(Benchmark(f"load_tasks[{codec}]", setup_codec_load(codec_path), load_tasks, codec_path))
+    benchmarks += [Benchmark(f"sort_tasks[{str(sort_type)}]", setup_sort(sort_type), TaskView.sort_tasks) for sort_type in SortType]
+    benchmarks.append(Benchmark("populate_list", setup_populate, populate))
+    benchmarks.append(Benchmark("first_row", setup_first_row(False), first_row, path))
+    benchmarks.append(Benchmark("first_row[indexed]", setup_first_row(True), first_row_indexed, indexed_path))
+
+    return benchmarks
+
+# code run in a new python process by the startup benchmark
+# creates the same window as main.py and prints a line when the window is first painted and when the edit form has been created
+STARTUP_SCRIPT = """
+import sys
+import main
+from PySide6 import QtCore, QtWidgets
+
+class FirstPaint(QtCore.QObject):
+    painted = False
+
+    def eventFilter(self, watched, event):
+        if event.type() == QtCore.QEvent.Type.Paint and not self.painted:
+            self.painted = True
+            print("first_frame", flush=True)
+        return False
+
+app = QtWidgets.QApplication(sys.argv)
+window = main.create_window()
+first_paint = FirstPaint()
+window.centralWidget().installEventFilter(first_paint)
+window.show()
+
+while window.centralWidget().edit_view is None:
+    app.processEvents(QtCore.QEventLoop.ProcessEventsFlag.WaitForMoreEvents)
+print("ready", flush=True)
+"""
+
+# modules that shouldn't be imported until they are used, the startup benchmark fails if they are imported at startup
+DEFERRED_MODULES = ["jsonpickle"]
+
+# parses the output of python -X importtime into the time taken by each module, in microseconds
+# each line looks like "import time:       346 |       2847 |         json"
+def parse_import_times(output: str) -> dict[str, tuple[int, int]]:
+    import_times = {}
+
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        import_times[name.strip()] = (int(self_time), int(cumulative_time))
+
+    return import_times
+
+# starts the app in a new python process and times how long it takes to paint the first frame and to create the edit form
+# returns the results and the names of any deferred modules that were imported
+def measure_startup(repeat: int) -> tuple[list[dict], list[str]]:
+    first_frame_times = []
+    ready_times = []
+    import_times = {}
+
+    for _ in range(repeat):
+        # ! the import times are written to a file rather than a pipe, so the process can't block on a full pipe while stdout is being read
+        with tempfile.TemporaryFile("w+", encoding="utf-8") as import_file:
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stdout=subprocess.PIPE,
+                stderr=import_file,
+                text=True
+            )
+
+            times = {}
+            for line in process.stdout:
+                times[line.strip()] = time.perf_counter() - start
+
+            process.wait()
+            import_file.seek(0)
+            import_times = parse_import_times(import_file.read())
+
+        # ? existence check: the app failed to start
+        if process.returncode != 0 or not "ready" in times:
+            raise RuntimeError(f"the app failed to start (exit code {process.returncode})")
+
+        first_frame_times.append(times["first_frame"])
+        ready_times.append(times["ready"])
+
+    total_import_time = sum(self_time for self_time, _ in import_times.values()) / 1_000_000
+    results = [
+        {"benchmark": "startup_first_frame", "tasks": 0, "seconds": min(first_frame_times), "tasks_per_second": None, "peak_memory_bytes": None},
+        {"benchmark": "startup_ready", "tasks": 0, "seconds": min(ready_times), "tasks_per_second": None, "peak_memory_bytes": None},
+        {"benchmark": "startup_imports", "tasks": 0, "seconds": total_import_time, "tasks_per_second": None, "peak_memory_bytes": None},
+    ]
+
+    # the slowest imports, which are the first place to look if startup gets slower
+    print("slowest imports (cumulative):")
+    for name, (_, cumulative_time) in sorted(import_times.items(), key=lambda item: item[1][1], reverse=True)[:10]:
+        print(f"    {name:<40} {cumulative_time / 1000:8.1f}ms")
+
+    return (results, [module for module in DEFERRED_MODULES if module in import_times])
+
+# returns the current git commit, so results can be matched to the code that produced them
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# prints the change in time and memory of each result compared to a previous results file
+def compare_results(results: list[dict], previous_path: str):
+    with open(previous_path, encoding="utf-8") as previous_file:
+        previous = {(result["benchmark"], result["tasks"]): result for result in json.load(previous_file)["results"]}
+
+    print(f"\ncompared to {previous_path}:")
+    for result in results:
+        old = previous.get((result["benchmark"], result["tasks"]))
+
+        # ? existence check: the benchmark wasn't run by the previous results
+        if old is None:
+            continue
+
+        time_change = result["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        line = f"{result["benchmark"]:<24} {result["tasks"]:>9}  time x{time_change:.2f}"
+
+        # startup results don't measure memory
+        if result["peak_memory_bytes"] and old["peak_memory_bytes"]:
+            line += f"  memory x{result["peak_memory_bytes"] / old["peak_memory_bytes"]:.2f}"
+        if result.get("file_size_bytes") and old.get("file_size_bytes"):
+            line += f"  file size x{result["file_size_bytes"] / old["file_size_bytes"]:.2f}"
+
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks loading, saving, sorting and showing large numbers of tasks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="the task counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="the number of timed runs of each benchmark, the fastest is used")
+    parser.add_argument("--only", nargs="+", help="only run benchmarks whose name starts with one of these")
+    parser.add_argument("--startup", action="store_true", help="only benchmark starting the app, checking that slow modules aren't imported at startup")
+    parser.add_argument("--output", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="compare the results to a JSON file from a previous run")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv)
+
+    results = []
+    imported_modules = []
+    if args.startup:
+        results, imported_modules = measure_startup(args.repeat)
+
+        for result in results:
+            print(f"{result["benchmark"]:<24} {result["seconds"]:9.4f}s")
+        for module in imported_modules:
+            print(f"error: {module} was imported at startup, it should only be imported when it is used")
+
+        args.sizes = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks = get_benchmarks(directory)
+        if args.only:
+            benchmarks = [benchmark for benchmark in benchmarks if benchmark.name.startswith(tuple(args.only))]
+
+        for size in args.sizes:
+            tasks = generate_tasks(size)
+
+            for benchmark in benchmarks:
+                result = measure(benchmark, tasks, args.repeat)
+                results.append(result)
+                line = f"{result["benchmark"]:<24} {result["tasks"]:>9}  {result["seconds"]:9.4f}s  {result["tasks_per_second"] or 0:12.0f} tasks/s  {result["peak_memory_bytes"] / 2**20:8.1f} MiB"
+
+                # saving and loading show the size of the file, compared between codecs
+                if "file_size_bytes" in result:
+                    line += f"  file {result["file_size_bytes"] / 2**20:8.2f} MiB"
+
+                print(line)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({
+                "commit": get_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "date": datetime.now().isoformat(),
+                "results": results,
+            }, output_file, indent=2)
+
+    if args.compare:
+        compare_results(results, args.compare)
+
+    if len(imported_modules) > 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
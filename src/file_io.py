@@ -1,41 +1,506 @@
-import jsonpickle
+import contextlib
+import io
+import json
+import os
+import struct
+import sys
+from array import array
 
 from task import *
-from utils import ErrorMessage
+from tracing import traced
 
 # ? Data sources
 # ?     - task file (.tsk): was used as the primary data source because it provides a method of persistent data storage between sessions, allowing the user to save tasks they created in one session and load them in another session
+# ? Data types:
+# ?     - dict: used for the header line of a task file, which stores the format version and the fields stored for each task
+# ?     - list: used to store a single task record as a JSON array, the order of the values is given by the header's fields
+# ?     - tuple of columns: the tasks of a file loaded by another process are sent back as one list per field (see load_task_files)
+# ?     - array of unsigned 64 bit ints: the offset of each record in an indexed task file
+# ? Task file format (version 2):
+# ?     - line 1: header, e.g. {"format":"tsk","version":2,"fields":["title","class_name","due_date","priority","completed"]}
+# ?     - every other line: one task record, e.g. ["Ex 10.3","Maths","2025-08-05T00:00:00",2,false]
+# ?     - version 1 files (a single jsonpickle list of Task objects) can still be loaded
+# ?     - the whole file can be compressed with gzip, xz or zstd, which is detected from the first bytes of the file when it is read
+# ? Indexed task file format (version 3):
+# ?     - a 32 byte preamble: INDEX_MAGIC, the number of records, the next unused task id and the offset of the index
+# ?     - a header line and one record per line, as in version 2
+# ?     - the index: the offset of each record and of the end of the last record, so any record can be read without reading the others
+# ?     - indexed files are never compressed, as the records are read straight from the file (see lazy_tasks.py)
+
+# identifies task files and the version of the format written by save_tasks
+FORMAT_NAME = "tsk"
+FORMAT_VERSION = 2
+INDEXED_FORMAT_VERSION = 3
+
+# the first bytes of an indexed task file, followed by the record count, next task id and index offset (little endian)
+INDEX_MAGIC = b"TSKINDEX"
+INDEX_PREAMBLE = struct.Struct("<8sQQQ")
+
+# the fields written for each task, in the order they appear in a record
+TASK_FIELDS = ["title", "class_name", "due_date", "priority", "completed"]
+
+# used to convert stored priority values back into TaskPriority without an enum lookup
+PRIORITIES = tuple(TaskPriority)
+
+# how many records are read or written between progress updates
+PROGRESS_INTERVAL = 4096
+
+# the first bytes of a file compressed with each codec
+CODEC_MAGIC = {
+    "gzip": b"\x1f\x8b",
+    "xz": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+# the codec used to write a task file, chosen from the end of its path (e.g. homework.tsk.gz)
+CODEC_EXTENSIONS = {
+    ".gz": "gzip",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+TASK_FILE_EXTENSIONS = (".tsk",) + tuple(".tsk" + extension for extension in CODEC_EXTENSIONS)
+
+# gzip level 6 compresses repetitive task files almost as well as level 9 in a fraction of the time
+GZIP_LEVEL = 6
+# ! xz presets above 3 use a much larger dictionary (94 MiB at the default preset 6) for a small saving in file size
+XZ_PRESET = 3
+
+# raised when loading or saving is cancelled by the user
+class Cancelled(Exception):
+    pass
+
+# raises Cancelled if the event used to cancel a background load or save has been set
+def check_cancelled(cancel_event):
+    if not cancel_event is None and cancel_event.is_set():
+        raise Cancelled
+
+# returns the codec used to write a file, or None if it should be written uncompressed
+def get_path_codec(path: str) -> str | None:
+    return CODEC_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+# returns the codec a file was compressed with from its first bytes, or None if it isn't compressed
+# the bytes are peeked, so they are still read by whatever reads the file next
+def detect_codec(raw_file: io.BufferedReader) -> str | None:
+    start = raw_file.peek(8)
+
+    for codec, magic in CODEC_MAGIC.items():
+        if start.startswith(magic):
+            return codec
+
+    return None
+
+# returns a binary file that compresses or decompresses raw_file as it is written or read
+# ! data is compressed in small blocks as it is written, so the file is never held in memory twice
+# the codec modules are only imported when a compressed file is used
+def open_codec(raw_file, mode: str, codec: str) -> "CodecFile":
+    match codec:
+        case "gzip":
+            import gzip
+            import zlib
+            return CodecFile(gzip.GzipFile(fileobj=raw_file, mode=mode + "b", compresslevel=GZIP_LEVEL), (gzip.BadGzipFile, zlib.error))
+        case "xz":
+            import lzma
+            return CodecFile(lzma.LZMAFile(raw_file, mode, preset=XZ_PRESET if mode == "w" else None), (lzma.LZMAError,))
+        case "zstd":
+            # zstd is part of the standard library from python 3.14, and can be installed as the zstandard package on older versions
+            try:
+                from compression import zstd
+                return CodecFile(zstd.ZstdFile(raw_file, mode), (zstd.ZstdError,))
+            except ImportError:
+                pass
 
-# load tasks from file path
-def load_tasks(path: str) -> list[Task] | None:
-    # will display an error message if open(path) fails
-    try:
-        with open(path) as save_file:
-            # will display an error if the file cannot be decoded
             try:
-                # ! the file data is the primary data source for the application
-                # it allows the user to have tasks that persist between sessions
-                return jsonpickle.decode(save_file.read())
-            except:
-                ErrorMessage("Unable to load task file", "Selected task file could not be loaded because it is invald. Check if you have selected the correct file and that the file has not been corrupted.")
-    except:
-        ErrorMessage("Unable to open file", "Unable to open file, please make sure it exists")
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compressed task files need python 3.14 or the zstandard package") from None
+
+            return CodecFile(zstandard.open(raw_file, mode + "b", closefd=False), (zstandard.ZstdError,))
+        case _:
+            raise ValueError(f"unknown codec '{codec}'")
+
+# a compressed file that raises ValueError if the compressed data is invalid, like the rest of file_io
+# each codec raises its own errors, and EOFError if the file was cut short
+class CodecFile(io.BufferedIOBase):
+    def __init__(self, codec_file, errors: tuple):
+        super().__init__()
+
+        self.codec_file = codec_file
+        self.errors = (EOFError,) + errors
+
+    def readable(self) -> bool:
+        return self.codec_file.readable()
+
+    def writable(self) -> bool:
+        return self.codec_file.writable()
+
+    def read(self, size: int = -1) -> bytes:
+        try:
+            return self.codec_file.read(size)
+        except self.errors as error:
+            raise ValueError(f"compressed task file is invalid: {error}") from error
+
+    def read1(self, size: int = -1) -> bytes:
+        try:
+            return self.codec_file.read1(size)
+        except self.errors as error:
+            raise ValueError(f"compressed task file is invalid: {error}") from error
+
+    def write(self, data) -> int:
+        return self.codec_file.write(data)
+
+    def flush(self):
+        self.codec_file.flush()
+
+    # the codec file is closed after IOBase.close() has flushed it, which writes the end of the compressed data
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            super().close()
+        finally:
+            self.codec_file.close()
+
+# returns the codecs that can be used on this computer
+def get_available_codecs() -> list[str]:
+    codecs = []
+
+    for codec in CODEC_MAGIC:
+        try:
+            open_codec(io.BytesIO(), "w", codec)
+            codecs.append(codec)
+        except ValueError:
+            pass
+
+    return codecs
+
+# wraps an open binary task file as a text file, decompressing or compressing it if codec isn't None
+# ! closing the text file finishes the compressed data, the binary file is closed by whatever opened it
+def wrap_task_file(raw_file, mode: str, codec: str | None) -> io.TextIOWrapper:
+    stream = raw_file if codec is None else open_codec(raw_file, mode, codec)
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+# checks if an open binary file is an indexed task file, without moving the read position
+def is_indexed_file(raw_file: io.BufferedReader) -> bool:
+    return raw_file.peek(len(INDEX_MAGIC)).startswith(INDEX_MAGIC)
+
+# reads the preamble at the start of an indexed task file
+# returns the number of records, the next unused task id and the offset of the index
+# raises ValueError if the preamble is invalid
+def read_index_preamble(data) -> tuple[int, int, int]:
+    if len(data) < INDEX_PREAMBLE.size:
+        raise ValueError("indexed task file is too short")
+
+    magic, record_count, next_id, index_offset = INDEX_PREAMBLE.unpack_from(data)
+
+    # ? existence check: the index has to be after the preamble and fit in the file
+    if magic != INDEX_MAGIC or index_offset < INDEX_PREAMBLE.size:
+        raise ValueError("indexed task file has an invalid preamble")
+
+    return (record_count, next_id, index_offset)
+
+# the part of a binary file before an end offset
+# used to read the header and records of an indexed task file as text, without reading the index after them
+class FileSection(io.RawIOBase):
+    def __init__(self, raw_file, end: int):
+        super().__init__()
+
+        self.raw_file = raw_file
+        self.end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.end - self.raw_file.tell())
+
+        if size <= 0:
+            return 0
+
+        data = self.raw_file.read(size)
+        buffer[:len(data)] = data
+        return len(data)
+
+# wraps an open binary task file as a text file for reading, whichever layout it was written with
+# compressed files are decompressed, and only the header and records of indexed files are read
+def read_task_stream(raw_file: io.BufferedReader) -> io.TextIOWrapper:
+    if is_indexed_file(raw_file):
+        _, _, index_offset = read_index_preamble(raw_file.read(INDEX_PREAMBLE.size))
+        return io.TextIOWrapper(io.BufferedReader(FileSection(raw_file, index_offset)), encoding="utf-8")
+
+    return wrap_task_file(raw_file, "r", detect_codec(raw_file))
+
+# opens a task file as a text file
+# when reading, the codec is detected from the start of the file. When writing, the codec is chosen from the path unless it is given
+@contextlib.contextmanager
+def open_task_file(path: str, mode: str = "r", codec: str | None = None):
+    with open(path, mode + "b") as raw_file:
+        if mode == "r":
+            task_file = read_task_stream(raw_file)
+        else:
+            task_file = wrap_task_file(raw_file, mode, get_path_codec(path) if codec is None else codec)
+
+        with task_file:
+            yield task_file
+
+# encodes a header or record as a single line of compact JSON
+encode_json = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+# converts a task into a record that can be written to a task file
+def encode_task(task: Task) -> list:
+    return [task.title, task.class_name, task.due_date.isoformat(), int(task.priority), task.completed]
+
+# creates a function that converts records back into tasks
+# the positions of each field are looked up once from the file header instead of once per record
+def get_task_decoder(fields: list[str]):
+    title = fields.index("title")
+    class_name = fields.index("class_name")
+    due_date = fields.index("due_date")
+    priority = fields.index("priority")
+    completed = fields.index("completed")
+    # files saved by the app store each task's id, see journal.py
+    task_id = fields.index("id") if "id" in fields else None
+
+    from_iso = datetime.fromisoformat
+
+    def decode_task(record: list) -> Task:
+        task = Task(record[title], from_iso(record[due_date]), record[class_name], PRIORITIES[record[priority]])
+        # set directly as the task is being loaded, not changed by the user
+        task.completed = bool(record[completed])
+        if not task_id is None:
+            task.id = record[task_id]
+        return task
+
+    return decode_task
+
+# creates the header line written at the start of a task file
+def encode_header(fields: list[str] = TASK_FIELDS, version: int = FORMAT_VERSION) -> dict:
+    return {"format": FORMAT_NAME, "version": version, "fields": fields}
+
+# checks if the first line of a task file is from a version 1 file
+# version 1 files are a single JSON list created by jsonpickle
+def is_legacy_header(header_line: str) -> bool:
+    return header_line.lstrip().startswith("[")
+
+# decodes the header line of a task file and returns the fields stored for each task
+# raises ValueError if the file is not a valid task file
+def decode_header(header_line: str) -> list[str]:
+    header = json.loads(header_line)
+
+    # ? existence check: make sure the file is a task file in a version that can be read
+    if not isinstance(header, dict) or header.get("format") != FORMAT_NAME:
+        raise ValueError("not a task file")
+    if header.get("version", 0) > INDEXED_FORMAT_VERSION:
+        raise ValueError(f"unsupported task file version {header.get("version")}")
+
+    return header["fields"]
+
+# reads tasks from an open task file one record at a time
+# raises ValueError if the file is not a valid task file
+def read_tasks(save_file):
+    header_line = save_file.readline()
+
+    if is_legacy_header(header_line):
+        yield from read_legacy_tasks(header_line + save_file.read())
+        return
+
+    decode_task = get_task_decoder(decode_header(header_line))
+    decode_json = json.loads
+
+    for line in save_file:
+        # skip blank lines (e.g. a trailing newline)
+        if line.isspace():
+            continue
+
+        yield decode_task(decode_json(line))
+
+# reads tasks from a version 1 task file (the jsonpickle format)
+@traced
+def read_legacy_tasks(data: str) -> list[Task]:
+    # ! jsonpickle is only imported when a version 1 file is opened, as importing it slows down starting the app
+    import jsonpickle
+
+    tasks = jsonpickle.decode(data)
+
+    # ? type check: jsonpickle can decode any object, so make sure a list of tasks was loaded
+    if not isinstance(tasks, list) or not all(isinstance(task, Task) for task in tasks):
+        raise ValueError("task file does not contain a list of tasks")
+
+    # ! jsonpickle doesn't call Task.__init__, so fields added since version 1 are given their default values here
+    for task in tasks:
+        task.id = None
+
+    return tasks
+
+# writes a header and then each task record to an open task file
+def write_tasks(save_file, tasks: list[Task]):
+    save_file.write(encode_json(encode_header()) + "\n")
+    # records are written one at a time, the encoded file is never held in memory as one string
+    save_file.writelines(encode_json(encode_task(task)) + "\n" for task in tasks)
+
+# writes an indexed task file to a binary file opened for writing, see the indexed task file format at the top of this file
+# records are lists of values in the order of fields. If fields has an id field, the next unused id is one more than the largest id
+# progress is called with the fraction of records that have been written
+# ! only the index is kept in memory (8 bytes per record), the records are written as they are encoded
+def write_indexed_tasks(raw_file, fields: list[str], records, record_count: int = 0, progress=None):
+    id_index = fields.index("id") if "id" in fields else None
+    next_id = 0
+
+    # the preamble is written again once the number of records and the position of the index are known
+    raw_file.write(INDEX_PREAMBLE.pack(INDEX_MAGIC, 0, 0, 0))
+    raw_file.write((encode_json(encode_header(fields, INDEXED_FORMAT_VERSION)) + "\n").encode("utf-8"))
+
+    offsets = array("Q")
+    offset = raw_file.tell()
+
+    for record in records:
+        line = (encode_json(record) + "\n").encode("utf-8")
+        raw_file.write(line)
+
+        offsets.append(offset)
+        offset += len(line)
+
+        if id_index is None:
+            next_id += 1
+        else:
+            next_id = max(next_id, record[id_index] + 1)
+
+        if len(offsets) % PROGRESS_INTERVAL == 0 and not progress is None:
+            progress(len(offsets) / max(record_count, 1))
+
+    record_count = len(offsets)
+    offsets.append(offset)
+
+    # the index is aligned to 8 bytes so it can be read in place (see lazy_tasks.py)
+    # the padding is blank lines, which are skipped when the records are read as text
+    padding = -offset % offsets.itemsize
+    raw_file.write(b"\n" * padding)
+    index_offset = offset + padding
+
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    raw_file.write(offsets.tobytes())
+
+    raw_file.seek(0)
+    raw_file.write(INDEX_PREAMBLE.pack(INDEX_MAGIC, record_count, next_id, index_offset))
+
+# load tasks from file path
+# ! errors are raised rather than shown, so task files can be loaded without a GUI (e.g. by task_cli.py)
+# raises OSError if the file cannot be opened and ValueError if it isn't a valid task file
+@traced
+def load_tasks(path: str) -> list[Task]:
+    with open_task_file(path) as save_file:
+        try:
+            # ! the file data is the primary data source for the application
+            # it allows the user to have tasks that persist between sessions
+            return list(read_tasks(save_file))
+        except (KeyError, IndexError, TypeError) as error:
+            # records with missing or invalid fields
+            raise ValueError("task file contains an invalid task record") from error
 
 # save the list of Tasks to a file at the provided file path
-def save_tasks(path: str, tasks: list[Task]):
-    # will display an error message if open() fails
-    try:
-        with open(path, "w") as save_file:
-            # will display an error message if the data cannot be encoded
+# the file is compressed with codec, or with the codec given by the path's extension (e.g. homework.tsk.gz) if codec is None
+# indexed files can be opened without decoding every task (see lazy_tasks.py), but can't be compressed
+# raises OSError if the file cannot be written and ValueError if the codec isn't available
+@traced
+def save_tasks(path: str, tasks: list[Task], codec: str | None = None, indexed: bool = False):
+    if indexed:
+        # ? existence check: indexed files are read in place, so they can't be compressed
+        if not codec is None or not get_path_codec(path) is None:
+            raise ValueError("indexed task files can't be compressed")
+
+        with open(path, "wb") as raw_file:
+            write_indexed_tasks(raw_file, TASK_FIELDS, (encode_task(task) for task in tasks))
+        return
+
+    with open_task_file(path, "w", codec) as save_file:
+        write_tasks(save_file, tasks)
+
+# finds the task files in a folder, sorted by name so they are always loaded in the same order
+# ! task databases aren't included, as they would have to be read into memory to be combined with other files
+def find_task_files(directory: str) -> list[str]:
+    return sorted(entry.path for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith(TASK_FILE_EXTENSIONS))
+
+# converts a list of tasks into one list per field, which is much faster to send between processes than a list of Task objects
+def encode_task_columns(tasks: list[Task]) -> tuple:
+    return (
+        [task.title for task in tasks],
+        [task.class_name for task in tasks],
+        [task.due_date for task in tasks],
+        bytes(int(task.priority) for task in tasks),
+        bytes(task.completed for task in tasks),
+    )
+
+def decode_task_columns(columns: tuple) -> list[Task]:
+    tasks = []
+
+    for title, class_name, due_date, priority, completed in zip(*columns):
+        task = Task(title, due_date, class_name, PRIORITIES[priority])
+        task.completed = completed == 1
+        tasks.append(task)
+
+    return tasks
+
+# loads a task file in a separate process, including any changes stored in its journal (see journal.py)
+def load_task_file_columns(path: str) -> tuple:
+    if os.path.exists(path + ".journal"):
+        from journal import TaskJournal
+        return encode_task_columns(TaskJournal(path).load())
+
+    return encode_task_columns(load_tasks(path))
+
+# loads several task files, decoding them in parallel in separate processes
+# returns the tasks from every file that was loaded, in the order of paths, and the error raised by each file that couldn't be loaded
+# ! a file that can't be loaded doesn't stop the other files from loading
+# raises Cancelled if cancel_event is set, progress is called with the fraction of files that have been loaded
+@traced
+def load_task_files(paths: list[str], max_workers: int | None = None, progress=None, cancel_event=None) -> tuple[list[Task], dict[str, Exception]]:
+    results: dict[str, tuple] = {}
+    errors: dict[str, Exception] = {}
+
+    max_workers = min(len(paths), max_workers or os.cpu_count() or 1)
+
+    # starting processes takes longer than loading a single file
+    if max_workers <= 1:
+        for loaded, path in enumerate(paths, 1):
+            check_cancelled(cancel_event)
             try:
-                json_data = jsonpickle.encode(tasks)
-                if not json_data is None:
-                    save_file.write(json_data)
-                else:
-                    # raise an exception if the encoded data is None
-                    # triggers error handling
-                    raise ValueError
-            except:
-                ErrorMessage("Unable to save tasks", "Unable to save tasks to file. Ensure that the file location is able to be written to.")
-    except:
-        ErrorMessage("Unable to save tasks", "Unable to write to selected file location. Please ensure that the file location is valid and writable.")
\ No newline at end of file
+                results[path] = load_task_file_columns(path)
+            except Exception as error:
+                errors[path] = error
+
+            if not progress is None:
+                progress(loaded / len(paths))
+    else:
+        # ! only imported when a folder is opened, as the process pool modules are slow to import
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+        # ! the platform's default start method is used. Workers only decode files, so forking them from the app's threads is safe,
+        # ! whereas spawning would import the whole app (and Qt) again in every worker
+        executor = ProcessPoolExecutor(max_workers)
+        try:
+            futures = {executor.submit(load_task_file_columns, path): path for path in paths}
+            pending = set(futures)
+
+            while len(pending) > 0:
+                # the cancel event is checked between files, a file that is already being decoded finishes in the background
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                check_cancelled(cancel_event)
+
+                for future in done:
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as error:
+                        errors[futures[future]] = error
+
+                if not progress is None:
+                    progress(1 - len(pending) / len(paths))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    tasks = []
+    for path in paths:
+        if path in results:
+            tasks += decode_task_columns(results[path])
+
+    # the errors are returned in the order of paths rather than the order the files finished loading
+    return (tasks, {path: errors[path] for path in paths if path in errors})
@@ -0,0 +1,208 @@
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+from task import *
+
+# ? Undo and redo history for changes made to the task list
+# ? Only the fields that changed are stored for each edit, never a copy of the whole task list
+# ? Data types:
+# ?     - FieldChange: the old and new value of one field of a task
+# ?     - InsertChange / DeleteChange: a task that was added to or removed from the task list, and its position
+# ?     - Edit: the changes made by one action, which are undone and redone together
+# ?     - int: the estimated number of bytes used by each change, used to limit the memory used by the history
+# ? Data structures:
+# ?     - deque[Edit]: the edits that can be undone, oldest first. The oldest edits are removed once the memory limit is reached
+# ?     - list[Edit]: the edits that can be redone, the most recently undone edit is last
+
+# the fields of a task that can be changed, in the order returned by task_values
+TASK_VALUE_FIELDS = ("title", "class_name", "due_date", "priority", "completed")
+
+# the default memory limit of the history, in bytes
+HISTORY_MEMORY_LIMIT = 4 * 1024 * 1024
+# edits to the same task within this many seconds of each other are undone as one edit
+# e.g. ticking and unticking a task a few times is undone in one step
+COALESCE_INTERVAL = 1.0
+
+# the size of a change object and its entry in an edit, estimated once
+CHANGE_SIZE = 120
+
+# returns the values of a task's fields, used to find which fields an edit changed
+def task_values(task: Task) -> tuple:
+    return (task.title, task.class_name, task.due_date, task.priority, task.completed)
+
+# estimates the memory used by a value that is only referenced by the history
+# enums, bools and small ints are shared, so they don't use any extra memory
+def value_size(value) -> int:
+    if isinstance(value, (str, datetime)):
+        return sys.getsizeof(value)
+    return 0
+
+# estimates the memory used by a task that the history could be the only reference to (e.g. a deleted task)
+def task_size(task: Task) -> int:
+    return sys.getsizeof(task) + sum(value_size(value) for value in task_values(task))
+
+# the old and new value of one field of a task
+# index is where the task was when it was changed, the task is looked up again if it has moved since or index is None (see find_task)
+class FieldChange:
+    __slots__ = ("task", "index", "field", "old", "new")
+
+    def __init__(self, task: Task, index: int | None, field: str, old, new):
+        self.task = task
+        self.index = index
+        self.field = field
+        self.old = old
+        self.new = new
+
+    def size(self) -> int:
+        return CHANGE_SIZE + value_size(self.old) + value_size(self.new)
+
+# a task that was added to the task list at an index
+class InsertChange:
+    __slots__ = ("task", "index")
+
+    def __init__(self, task: Task, index: int):
+        self.task = task
+        self.index = index
+
+    def size(self) -> int:
+        return CHANGE_SIZE + task_size(self.task)
+
+# a task that was removed from the task list at an index
+class DeleteChange(InsertChange):
+    __slots__ = ()
+
+# the changes made by one action
+class Edit:
+    __slots__ = ("changes", "time", "size")
+
+    def __init__(self, changes: list, edit_time: float):
+        self.changes = changes
+        self.time = edit_time
+        self.size = sum(change.size() for change in changes)
+
+    # checks if an edit only changes the fields of a single task, which is the only kind of edit that is coalesced
+    def is_field_edit_of(self, task: Task) -> bool:
+        return all(isinstance(change, FieldChange) and change.task is task for change in self.changes)
+
+    # adds the changes of a later edit to the same task, keeping the oldest value of each field
+    # fields that are changed back to their oldest value are removed, as undoing them would do nothing
+    def coalesce(self, changes: list[FieldChange], edit_time: float):
+        fields = {change.field: change for change in self.changes}
+
+        for change in changes:
+            if change.field in fields:
+                fields[change.field].new = change.new
+                fields[change.field].index = change.index
+            else:
+                fields[change.field] = change
+
+        self.changes = [change for change in fields.values() if change.old != change.new]
+        self.time = edit_time
+        self.size = sum(change.size() for change in self.changes)
+
+# records the edits made to the task list so they can be undone and redone
+# ! the memory used by the history is limited by removing the oldest edits, so long sessions can't use an unbounded amount of memory
+class UndoHistory:
+    def __init__(self, memory_limit: int = HISTORY_MEMORY_LIMIT, coalesce_interval: float = COALESCE_INTERVAL):
+        self.memory_limit = memory_limit
+        self.coalesce_interval = coalesce_interval
+
+        self.undo_edits: deque[Edit] = deque()
+        self.redo_edits: list[Edit] = []
+        # the estimated number of bytes used by every edit in the history
+        self.size = 0
+
+    def can_undo(self) -> bool:
+        return len(self.undo_edits) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_edits) > 0
+
+    # removes every edit, e.g. when a different file is opened
+    def clear(self):
+        self.undo_edits.clear()
+        self.redo_edits.clear()
+        self.size = 0
+
+    # the functions below record an edit after it has been made
+
+    # records changes to the fields of one or more tasks as a single edit, e.g. a batch of changes (see task_changes.py)
+    def record_fields(self, changes: list[FieldChange]):
+        # ? existence check: the task was saved without changing any fields
+        if len(changes) == 0:
+            return
+
+        edit_time = time.monotonic()
+        last_edit = self.undo_edits[-1] if self.can_undo() else None
+        task = changes[0].task
+
+        # rapid edits to the same task are combined into the last edit, unless it has been undone
+        # ! edits that change several tasks are never combined
+        if not last_edit is None and not self.can_redo() and edit_time - last_edit.time < self.coalesce_interval and all(change.task is task for change in changes) and last_edit.is_field_edit_of(task):
+            self.size -= last_edit.size
+            last_edit.coalesce(changes, edit_time)
+            self.size += last_edit.size
+
+            # the task was changed back to how it was before the last edit
+            if len(last_edit.changes) == 0:
+                self.undo_edits.pop()
+            return
+
+        self.record(changes)
+
+    def record_insert(self, task: Task, index: int):
+        self.record([InsertChange(task, index)])
+
+    def record_delete(self, task: Task, index: int):
+        self.record([DeleteChange(task, index)])
+
+    # records the changes made by one action as a single edit
+    # making a new edit means the edits that were undone can no longer be redone
+    def record(self, changes: list):
+        self.size -= sum(edit.size for edit in self.redo_edits)
+        self.redo_edits.clear()
+
+        edit = Edit(changes, time.monotonic())
+        self.undo_edits.append(edit)
+        self.size += edit.size
+
+        # remove the oldest edits until the history is within the memory limit
+        # ! the newest edit is always kept, so the last action can be undone even if it is larger than the limit
+        while self.size > self.memory_limit and len(self.undo_edits) > 1:
+            self.size -= self.undo_edits.popleft().size
+
+    # returns the edit to undo and moves it to the redo history, or None if there is nothing to undo
+    # the changes of the edit should be reverted in reverse order
+    def undo(self) -> Edit | None:
+        if not self.can_undo():
+            return None
+
+        edit = self.undo_edits.pop()
+        self.redo_edits.append(edit)
+        return edit
+
+    # returns the edit to redo and moves it back to the undo history, or None if there is nothing to redo
+    def redo(self) -> Edit | None:
+        if not self.can_redo():
+            return None
+
+        edit = self.redo_edits.pop()
+        # ! an edit that is redone isn't coalesced with the next edit
+        edit.time = -self.coalesce_interval
+        self.undo_edits.append(edit)
+        return edit
+
+# returns the index of a task in the task list, using the index it was at when it was changed if it hasn't moved
+# returns None if the task is no longer in the list
+def find_task(tasks: list[Task], task: Task, index: int | None) -> int | None:
+    if not index is None and index < len(tasks) and tasks[index] is task:
+        return index
+
+    # the task has moved, e.g. the list was sorted or an earlier task was removed
+    # ! tasks are compared by identity, and lazily loaded lists only check the tasks that have been decoded (see lazy_tasks.py)
+    try:
+        return tasks.index(task)
+    except ValueError:
+        return None
@@ -0,0 +1,344 @@
+import json
+import os
+import threading
+
+from task import *
+from file_io import *
+from lazy_tasks import *
+from task_map import assign_task_ids
+from tracing import traced
+
+# ? Data sources
+# ?     - journal file (.tsk.journal): stores the changes made to a task file since it was last written in full
+# ?       saving only appends the changes, so the cost of saving depends on how many tasks changed rather than the number of tasks
+# ?     - task file (.tsk): written as an indexed task file unless it is compressed, so it can be opened without decoding every task
+# ? Data types:
+# ?     - int: each task in a journaled file has an id (Task.id), used by journal records to refer to the task
+# ?     - list: used to store a single journal record as a JSON array, e.g. ["put", 3, "Ex 10.3", "Maths", "2025-08-05T00:00:00", 2, false] or ["del", 3]
+# ? Data structures:
+# ?     - dict[int, Task | None]: the dirty tasks, i.e. the tasks changed since the last save by their id, None for tasks that were removed
+# ?       tasks are only encoded when the changes are written, so a task that changes many times before a save is encoded once
+
+# the size in bytes the journal can grow to before it's compacted into the task file
+COMPACT_THRESHOLD = 1024 * 1024
+
+# fields written for each task in a journaled task file
+# the id field is ignored when the file is loaded with load_tasks
+SNAPSHOT_FIELDS = ["id"] + TASK_FIELDS
+
+# journal record operations
+PUT = "put"
+DELETE = "del"
+
+# reads the records in a task file, returns a dict of task ids to records
+# records are returned with the fields in the order of TASK_FIELDS
+# progress is called with the fraction of the file that has been read
+def read_snapshot(path: str, progress=None, cancel_event=None) -> dict[int, list]:
+    records = {}
+    file_size = max(os.path.getsize(path), 1)
+
+    # the task file may be compressed, so progress is measured by how far through the file on disk has been read
+    with open(path, "rb") as raw_file, read_task_stream(raw_file) as save_file:
+        header_line = save_file.readline()
+
+        # version 1 files have no records, so the tasks are converted into records
+        if is_legacy_header(header_line):
+            for task_id, task in enumerate(read_legacy_tasks(header_line + save_file.read())):
+                records[task_id] = encode_task(task)
+            return records
+
+        fields = decode_header(header_line)
+        order = [fields.index(field) for field in TASK_FIELDS]
+        # files saved with save_tasks have no ids, so the position of each task is used instead
+        id_index = fields.index("id") if "id" in fields else None
+
+        position = 0
+        for line in save_file:
+            if line.isspace():
+                continue
+
+            record = json.loads(line)
+            task_id = position if id_index is None else record[id_index]
+            records[task_id] = [record[i] for i in order]
+            position += 1
+
+            if position % PROGRESS_INTERVAL == 0:
+                check_cancelled(cancel_event)
+                if not progress is None:
+                    progress(raw_file.tell() / file_size)
+
+    return records
+
+# applies the changes stored in a journal to a dict of records
+# replaying the same change more than once has no extra effect, so a journal that was partly compacted can be replayed safely
+def replay_journal(records: dict[int, list], lines: list[str]):
+    for line in lines:
+        if line.isspace():
+            continue
+
+        change = json.loads(line)
+
+        # skip the header line
+        if isinstance(change, dict):
+            continue
+
+        if change[0] == PUT:
+            records[change[1]] = change[2:]
+        elif change[0] == DELETE:
+            records.pop(change[1], None)
+
+# writes a full task file containing each task's id, compressed with codec if it isn't None
+# uncompressed files are indexed, so they can be opened with TaskJournal.load_lazy
+# progress is called with the fraction of records that have been written
+def write_snapshot(path: str, records, record_count: int = 0, progress=None, codec: str | None = None):
+    if codec is None:
+        with open(path, "wb") as raw_file:
+            write_indexed_tasks(raw_file, SNAPSHOT_FIELDS, ([task_id] + record for task_id, record in records), record_count, progress)
+        return
+
+    with open_task_file(path, "w", codec) as save_file:
+        save_file.write(encode_json(encode_header(SNAPSHOT_FIELDS)) + "\n")
+
+        for written, (task_id, record) in enumerate(records, 1):
+            save_file.write(encode_json([task_id] + record) + "\n")
+
+            if written % PROGRESS_INTERVAL == 0 and not progress is None:
+                progress(written / max(record_count, 1))
+
+# stores a task file as a snapshot of all tasks plus a journal of changes made since the snapshot
+class TaskJournal:
+    def __init__(self, path: str, compact_threshold: int = COMPACT_THRESHOLD):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_threshold = compact_threshold
+        # the codec the task file is compressed with, chosen from the path until the file is loaded
+        # ! the journal itself is never compressed, so changes can be appended to it
+        self.codec = get_path_codec(path)
+
+        # the id given to new tasks that don't have one yet
+        self.next_id = 0
+        self.dirty: dict[int, Task | None] = {}
+
+        # the tasks opened by load_lazy, which keep the task file mapped into memory until they are detached
+        self.lazy_tasks: LazyTaskList | None = None
+        # the error raised by the last compaction if it failed, reported by the app the next time the tasks are saved
+        self.compact_error: Exception | None = None
+
+        # ! held while the journal file is being appended to or replaced
+        # ! the task file is compacted on a background thread
+        self.lock = threading.Lock()
+        self.compact_thread = None
+
+    # loads the tasks from the task file and replays the journal on top of them
+    # raises OSError if the file cannot be read, ValueError if it is invalid and Cancelled if cancel_event is set
+    # progress is called with the fraction of the file that has been loaded
+    @traced
+    def load(self, progress=None, cancel_event=None) -> list[Task]:
+        # reading the file is the first half of loading, decoding the tasks is the second half
+        read_progress = None if progress is None else lambda fraction: progress(fraction / 2)
+
+        with self.lock:
+            with open(self.path, "rb") as raw_file:
+                self.codec = detect_codec(raw_file)
+
+            records = read_snapshot(self.path, read_progress, cancel_event)
+
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, encoding="utf-8") as journal_file:
+                    replay_journal(records, journal_file.readlines())
+
+        decode_task = get_task_decoder(TASK_FIELDS)
+        tasks = []
+
+        for task_id, record in records.items():
+            task = decode_task(record)
+            task.id = task_id
+            tasks.append(task)
+
+            if len(tasks) % PROGRESS_INTERVAL == 0:
+                check_cancelled(cancel_event)
+                if not progress is None:
+                    progress(0.5 + len(tasks) / len(records) / 2)
+
+        self.next_id = max(records, default=-1) + 1
+        self.dirty.clear()
+
+        return tasks
+
+    # opens an indexed task file without decoding its tasks, see lazy_tasks.py
+    # returns None if the file isn't indexed or has changes in its journal, as replaying them needs every task to be decoded
+    # raises OSError if the file cannot be read and ValueError if it is invalid
+    @traced
+    def load_lazy(self) -> LazyTaskList | None:
+        with self.lock:
+            if os.path.exists(self.journal_path):
+                return None
+
+            with open(self.path, "rb") as raw_file:
+                if not is_indexed_file(raw_file):
+                    return None
+
+            tasks = LazyTaskList(IndexedTaskFile(self.path))
+
+        # tasks are given their id from the file when they are decoded
+        self.codec = None
+        self.next_id = tasks.task_file.next_id
+        self.lazy_tasks = tasks
+        self.dirty.clear()
+
+        return tasks
+
+    # writes every task to the task file and starts a new, empty journal
+    # used the first time a list of tasks is saved to this path
+    def create(self, tasks: list[Task]):
+        self.write_all(self.reset(tasks))
+
+    # clears the dirty tasks, giving an id to each task that doesn't have one
+    # returns the tasks and their ids, which are passed to write_all()
+    # ! tasks keep the ids they already have, so a task has the same id in every file it is saved to
+    # ! called on the GUI thread, so tasks changed after this are marked as dirty even if write_all() is still running
+    def reset(self, tasks: list[Task]) -> list[tuple[int, Task]]:
+        self.wait_for_compaction()
+
+        tasks = list(tasks)
+        self.next_id = assign_task_ids(tasks)
+        self.dirty.clear()
+
+        return [(task.id, task) for task in tasks]
+
+    # writes the tasks returned by reset() to the task file and removes the old journal
+    # can be run on a background thread
+    # ! the file is written next to the old one and then replaces it, so a failed write doesn't damage the old file
+    # ! a mapped file can't be replaced on Windows, so a LazyTaskList of the old file has to be detached first (see LazyTaskList.detach)
+    @traced
+    def write_all(self, items: list[tuple[int, Task]], progress=None, cancel_event=None):
+        with self.lock:
+            temp_path = self.path + ".tmp"
+            try:
+                write_snapshot(temp_path, ((task_id, encode_task(task)) for task_id, task in items), len(items), progress, self.codec)
+            except BaseException:
+                # don't leave a partly written file behind
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+            os.replace(temp_path, self.path)
+
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+    # the functions below mark a task as dirty, its changes are written when flush() is called
+
+    # ! a put record adds the task if it isn't in the file yet, so new and changed tasks are recorded the same way
+    def record_created(self, task: Task):
+        self.record_updated(task)
+
+    def record_updated(self, task: Task):
+        # ? existence check: tasks are given an id when they are added to the app's task list, this is only for tasks added without one
+        if task.id is None:
+            task.id = self.next_id
+        self.next_id = max(self.next_id, task.id + 1)
+
+        self.dirty[task.id] = task
+
+    def record_deleted(self, task: Task):
+        if not task.id is None:
+            self.dirty[task.id] = None
+
+    # checks if any tasks have changed since the last save
+    def is_dirty(self) -> bool:
+        return len(self.dirty) > 0
+
+    # appends a record for each dirty task to the journal
+    # compacts the journal in the background once it is larger than the compact threshold
+    @traced
+    def flush(self):
+        # nothing has changed since the last save
+        if not self.is_dirty():
+            return
+
+        written = list(self.dirty.items())
+        lines = [
+            encode_json([DELETE, task_id] if task is None else [PUT, task_id] + encode_task(task)) + "\n"
+            for task_id, task in written
+        ]
+
+        with self.lock:
+            with open(self.journal_path, "a", encoding="utf-8") as journal_file:
+                # new journals start with a header so the record fields can be changed in future versions
+                if journal_file.tell() == 0:
+                    journal_file.write(encode_json(encode_header(SNAPSHOT_FIELDS)) + "\n")
+
+                journal_file.writelines(lines)
+                journal_size = journal_file.tell()
+
+        # the tasks are only clean once their records have been written, so they are still saved by the next flush if writing fails
+        # replaying a record twice has no extra effect, so a partly written flush can safely be written again
+        for task_id, task in written:
+            if task_id in self.dirty and self.dirty[task_id] is task:
+                del self.dirty[task_id]
+
+        if journal_size > self.compact_threshold and not self.is_compacting():
+            # ! compacting replaces the task file, which can't be done while it is mapped into memory on Windows
+            if not self.lazy_tasks is None:
+                self.lazy_tasks.detach()
+                self.lazy_tasks = None
+
+            self.compact_thread = threading.Thread(target=self.compact)
+            self.compact_thread.start()
+
+    # returns the error raised by the last compaction and clears it, or None if it didn't fail
+    def take_compact_error(self) -> Exception | None:
+        error = self.compact_error
+        self.compact_error = None
+        return error
+
+    def is_compacting(self) -> bool:
+        return not self.compact_thread is None and self.compact_thread.is_alive()
+
+    def wait_for_compaction(self):
+        if self.is_compacting():
+            self.compact_thread.join()
+
+    # rewrites the task file with the journal applied to it, then removes the compacted part of the journal
+    # changes that are flushed while compacting are kept in the journal
+    # runs on a background thread, so errors are stored in compact_error instead of being raised
+    # ! the journal is only shortened once the new task file has replaced the old one, so no changes are lost if compacting fails
+    @traced
+    def compact(self):
+        temp_path = self.path + ".tmp"
+
+        try:
+            self.compact_files(temp_path)
+        except Exception as error:
+            # don't leave a partly written file behind
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            self.compact_error = error
+
+    def compact_files(self, temp_path: str):
+        with self.lock:
+            with open(self.journal_path, "rb") as journal_file:
+                journal_data = journal_file.read()
+
+        # the snapshot is only replaced while the lock is held, so it can be read without the lock
+        records = read_snapshot(self.path)
+        replay_journal(records, journal_data.decode("utf-8").splitlines())
+
+        write_snapshot(temp_path, records.items(), codec=self.codec)
+
+        with self.lock:
+            with open(self.journal_path, "rb") as journal_file:
+                journal_file.seek(len(journal_data))
+                journal_tail = journal_file.read()
+
+            os.replace(temp_path, self.path)
+
+            if len(journal_tail) == 0:
+                os.remove(self.journal_path)
+            else:
+                with open(temp_path, "wb") as journal_file:
+                    journal_file.write((encode_json(encode_header(SNAPSHOT_FIELDS)) + "\n").encode("utf-8"))
+                    journal_file.write(journal_tail)
+
+                os.replace(temp_path, self.journal_path)
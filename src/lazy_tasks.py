@@ -0,0 +1,158 @@
+import json
+import mmap
+import sys
+from array import array
+from collections.abc import MutableSequence
+
+from task import *
+from file_io import *
+
+# ? Opens indexed task files (see file_io.py) without decoding their tasks, which are decoded the first time they are used
+# ? e.g. when their row is shown in the task list, or when the list is searched, filtered or sorted
+# ? Data sources
+# ?     - indexed task file (.tsk, version 3): mapped into memory, so only the parts of the file that are read are loaded from disk
+# ? Data structures:
+# ?     - memoryview of unsigned 64 bit ints: the file's record offset index, read in place from the mapped file
+# ?     - list[Task | None]: the task in each position of the list, None until the task has been decoded
+# ?     - array of ints: the record each position of the list was loaded from, -1 for tasks added after the file was opened.
+# ?       Only created once a task is added or removed, until then position i is record i
+
+# an indexed task file that records can be read from in any order
+# raises OSError if the file cannot be opened and ValueError if it isn't a valid indexed task file
+class IndexedTaskFile:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+
+        try:
+            # ! empty files can't be mapped, mmap raises ValueError for them
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.record_count, self.next_id, index_offset = read_index_preamble(self.map)
+
+            # ? existence check: the index has to fit in the file
+            index_end = index_offset + (self.record_count + 1) * 8
+            if index_end > len(self.map):
+                raise ValueError("indexed task file is missing its index")
+
+            # ! the index is read in place, so opening the file takes the same time however many records it has
+            if sys.byteorder == "little":
+                self.offsets = memoryview(self.map)[index_offset:index_end].cast("Q")
+            else:
+                self.offsets = array("Q", self.map[index_offset:index_end])
+                self.offsets.byteswap()
+
+            header_end = self.map.find(b"\n", INDEX_PREAMBLE.size, index_offset)
+            fields = decode_header(self.map[INDEX_PREAMBLE.size:header_end].decode("utf-8"))
+        except:
+            self.close()
+            raise
+
+        self.decode_task = get_task_decoder(fields)
+        # files saved with save_tasks have no ids, so the position of each record is used instead
+        self.has_ids = "id" in fields
+
+    # decodes a record into a task with its id
+    # raises ValueError if the record is invalid
+    def read_task(self, position: int) -> Task:
+        try:
+            task = self.decode_task(json.loads(self.map[self.offsets[position]:self.offsets[position + 1]]))
+        except (KeyError, IndexError, TypeError) as error:
+            raise ValueError("task file contains an invalid task record") from error
+
+        if not self.has_ids:
+            task.id = position
+        return task
+
+    def close(self):
+        # ! the index view has to be released before the map can be closed
+        if isinstance(getattr(self, "offsets", None), memoryview):
+            self.offsets.release()
+        if hasattr(self, "map"):
+            self.map.close()
+        self.file.close()
+
+# a list of the tasks in an indexed task file, each task is decoded the first time it is read
+# tasks can be added, removed and sorted like a normal list. Sorting decodes every task
+class LazyTaskList(MutableSequence):
+    def __init__(self, task_file: IndexedTaskFile):
+        self.task_file = task_file
+
+        self.tasks: list[Task | None] = [None] * task_file.record_count
+        self.records: array | None = None
+
+        # called with each task when it is decoded, e.g. to add it to the app's task map
+        self.decode_callbacks = []
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        task = self.tasks[index]
+        if task is None:
+            task = self.decode(index)
+
+        return task
+
+    def __setitem__(self, index: int, task: Task):
+        self.tasks[index] = task
+
+    def __delitem__(self, index: int):
+        self.get_records()
+        del self.tasks[index]
+        del self.records[index]
+
+    def __iter__(self):
+        for index in range(len(self.tasks)):
+            yield self[index]
+
+    # finds a task without decoding the tasks that haven't been used yet, as they can't be the task being looked for
+    def index(self, task: Task, start: int = 0, stop: int = sys.maxsize) -> int:
+        return self.tasks.index(task, start, stop)
+
+    def insert(self, index: int, task: Task):
+        self.get_records()
+        # list.insert clamps the index, so the record is inserted at the same position as the task
+        index = min(max(index + len(self.tasks) if index < 0 else index, 0), len(self.tasks))
+        self.tasks.insert(index, task)
+        self.records.insert(index, -1)
+
+    # sorts the tasks like list.sort, decoding every task first
+    def sort(self, key=None, reverse: bool = False):
+        self.decode_all()
+        self.tasks.sort(key=key, reverse=reverse)
+
+    # decodes the task at an index and keeps it in the list
+    def decode(self, index: int) -> Task:
+        if index < 0:
+            index += len(self.tasks)
+
+        task = self.task_file.read_task(index if self.records is None else self.records[index])
+        self.tasks[index] = task
+
+        for callback in self.decode_callbacks:
+            callback(task)
+
+        return task
+
+    def decode_all(self):
+        for index, task in enumerate(self.tasks):
+            if task is None:
+                self.decode(index)
+
+    # creates the array of the record each task was loaded from, before the positions of the tasks change
+    def get_records(self):
+        if self.records is None:
+            self.records = array("q", range(len(self.tasks)))
+
+    # decodes every task and closes the task file, after which the list no longer depends on the file
+    # used before the file is replaced, as a file that is mapped into memory can't be replaced on Windows
+    def detach(self):
+        self.decode_all()
+        self.close()
+
+    # closes the task file, tasks that haven't been decoded can no longer be read
+    def close(self):
+        self.task_file.close()
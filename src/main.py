@@ -1,25 +1,33 @@
+import os
 import sys
+import time
 from PySide6.QtWidgets import QApplication, QMainWindow, QMenuBar
 from PySide6.QtGui import QPalette
 
-from app import HomeworkOrganiser
-from menu import AppMenuBar
+import tracing
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+# tracing is enabled with --trace <path> (or the HOMEWORK_ORGANISER_TRACE environment variable)
+# ! this has to happen before the app's modules are imported, as they check if tracing is enabled when they are imported
+if "--trace" in sys.argv[:-1]:
+    flag_index = sys.argv.index("--trace")
+    tracing.enable(sys.argv[flag_index + 1])
+    del sys.argv[flag_index:flag_index + 2]
 
-    # set palette to colours that better match OSX dark mode
-    # TODO fix colours for light mode
-    # TODO how does it look on windows?
-    pal = QPalette()
-
-    mid_colour = pal.color(QPalette.ColorRole.Mid)
-    pal.setColor(QPalette.ColorRole.Window, mid_colour)
-    #app.setPalette(pal)
+from app import HomeworkOrganiser
+from menu import AppMenuBar
 
-    # ! maintainability: if a consistent cross-platform style is needed uncomment this line
-    #app.setStyle("Fusion")
+# records a span for every Qt event (paints, clicks, signals sent between threads, timers, etc.) while tracing is enabled
+class TracedApplication(QApplication):
+    def notify(self, receiver, event) -> bool:
+        start = time.perf_counter_ns()
+        try:
+            return super().notify(receiver, event)
+        finally:
+            tracing.record(event.type().name, start, time.perf_counter_ns(), "event")
 
+# creates the main window, with the menu bar and the app as its central widget
+# split from the main block so the startup benchmark (see benchmark.py) can create the same window
+def create_window() -> QMainWindow:
     # initialise window
     window = QMainWindow()
     window.setWindowTitle("Homework Organiser")
@@ -32,9 +40,51 @@ if __name__ == "__main__":
     homework_organiser = HomeworkOrganiser(menu_bar.tasks)
     window.setCentralWidget(homework_organiser)
 
-    menu_bar.tasks_loaded.connect(lambda: homework_organiser.on_tasks_loaded(menu_bar.tasks))
+    menu_bar.tasks_loaded.connect(lambda: homework_organiser.on_tasks_loaded(menu_bar.tasks, menu_bar.search_index, menu_bar.filter_index))
+
+    # show the name of the task file in the window title once it has been saved
+    menu_bar.tasks_saved.connect(lambda path: window.setWindowTitle(f"Homework Organiser - {os.path.basename(path)}"))
+
+    # record changes made to tasks in the open task file's journal
+    homework_organiser.task_added.connect(menu_bar.on_task_added)
+    homework_organiser.tasks_changed.connect(menu_bar.on_tasks_changed)
+    homework_organiser.task_removed.connect(menu_bar.on_task_removed)
+    menu_bar.flush_requested.connect(homework_organiser.change_notifier.flush)
+
+    # undo and redo edits made in the app
+    menu_bar.undo.triggered.connect(homework_organiser.undo)
+    menu_bar.redo.triggered.connect(homework_organiser.redo)
+    homework_organiser.history_changed.connect(lambda: menu_bar.set_history_state(homework_organiser.history.can_undo(), homework_organiser.history.can_redo()))
+
+    # change every task selected in the task list
+    menu_bar.complete_selected.triggered.connect(homework_organiser.complete_selected)
+    menu_bar.delete_selected.triggered.connect(homework_organiser.delete_selected)
+    menu_bar.set_class.triggered.connect(homework_organiser.set_selected_class)
+    for priority, action in menu_bar.priority_actions.items():
+        action.triggered.connect(lambda _=False, priority=priority: homework_organiser.set_selected_priority(priority))
+    homework_organiser.task_view.task_list.selection_changed.connect(menu_bar.set_selection_state)
 
     window.resize(768, 480)
+
+    return window
+
+if __name__ == "__main__":
+    # ! the normal QApplication is used when tracing is disabled, so events aren't slowed down
+    app = TracedApplication(sys.argv) if tracing.enabled else QApplication(sys.argv)
+
+    # set palette to colours that better match OSX dark mode
+    # TODO fix colours for light mode
+    # TODO how does it look on windows?
+    pal = QPalette()
+
+    mid_colour = pal.color(QPalette.ColorRole.Mid)
+    pal.setColor(QPalette.ColorRole.Window, mid_colour)
+    #app.setPalette(pal)
+
+    # ! maintainability: if a consistent cross-platform style is needed uncomment this line
+    #app.setStyle("Fusion")
+
+    window = create_window()
     window.show()
 
     # run application, exit when the app returns
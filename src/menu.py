@@ -1,14 +1,54 @@
+import os
+
 from PySide6 import QtWidgets
 from PySide6 import QtGui
 from PySide6 import QtCore
 
 from task import *
 from file_io import *
+from journal import *
+from worker import *
+from task_store import *
+from task_stream import merge_task_files
+from task_index import SearchIndex, FilterIndex
+from utils import ErrorMessage
+from tracing import traced
+
+# file dialog filters
+DATABASE_FILTER = "Task Databases (*.db)"
+COMPRESSED_FILTER = "Compressed Task Files (*.tsk.gz)"
+SAVE_FILTERS = f"Task Files (*.tsk);;{COMPRESSED_FILTER};;{DATABASE_FILTER}"
+OPEN_FILTERS = f"Task Files ({" ".join("*" + extension for extension in TASK_FILE_EXTENSIONS)});;{DATABASE_FILTER};;All Files (*)"
+
+# appends the extension of the file type selected in a save dialog to a task file path that doesn't have one
+# the extension chooses how the file is compressed, see get_path_codec in file_io
+def add_task_file_extension(path: str, name_filter: str) -> str:
+    if path.endswith(TASK_FILE_EXTENSIONS):
+        return path
+
+    return path + (".tsk.gz" if name_filter == COMPRESSED_FILTER else ".tsk")
+
+# the functions below are run by a worker to load tasks, and build the search and filter indexes of the tasks on the same thread
+# ! the tasks aren't shown until the worker has finished, so nothing else uses them while they are indexed
+
+# loads the tasks of a task file, replaying its journal
+def load_file_indexed(journal: TaskJournal, progress=None, cancel_event=None) -> tuple[list[Task], SearchIndex, FilterIndex]:
+    tasks = journal.load(progress, cancel_event)
+    return tasks, SearchIndex(tasks), FilterIndex(tasks)
+
+# loads the tasks of several task files as one list, see load_task_files in file_io
+def load_folder_indexed(paths: list[str], progress=None, cancel_event=None) -> tuple[list[Task], dict[str, Exception], SearchIndex, FilterIndex]:
+    tasks, errors = load_task_files(paths, progress=progress, cancel_event=cancel_event)
+    return tasks, errors, SearchIndex(tasks), FilterIndex(tasks)
 
 # wrapper class for the application menu bar
 # create 'save' and 'open' buttons which pass file paths to file_io
 class AppMenuBar(QtWidgets.QMenuBar):
     tasks_loaded = QtCore.Signal(list[Task])
+    # emitted with the path of the task file once the tasks have been saved
+    tasks_saved = QtCore.Signal(str)
+    # emitted before the tasks are saved or closed, so changes to tasks that haven't been reported yet are recorded (see task_changes.py)
+    flush_requested = QtCore.Signal()
 
     def __init__(self):
         super().__init__()
@@ -17,6 +57,26 @@ class AppMenuBar(QtWidgets.QMenuBar):
         # ! the task list is an important data structure:
         # ! it stores the information for each task that the user has entered
         self.tasks = []
+        # the search and filter indexes of the tasks, if they were built by the worker that loaded them
+        self.search_index: SearchIndex | None = None
+        self.filter_index: FilterIndex | None = None
+
+        # the journal of the open task file, None if the tasks haven't been saved to or loaded from a file
+        self.journal: TaskJournal | None = None
+        # the journal of a file that is being loaded or saved by a worker
+        self.pending_journal: TaskJournal | None = None
+        # the tasks being saved by a worker and their ids
+        self.pending_items: list[tuple[int, Task]] = []
+        # the journal of the file being written by save as, None if the tasks aren't being saved
+        # ! tasks changed while the file is being written are recorded in this journal too, so they are written by the next save
+        self.saving_journal: TaskJournal | None = None
+        self.pending_path = ""
+        self.worker: Worker | None = None
+
+        # True if the tasks have changed since they were loaded, only used when no task file is open as the journal tracks its own dirty tasks
+        self.modified = False
+        # True if the tasks are closed once the worker saving them has finished
+        self.close_after_save = False
 
         file_menu = self.addMenu("File")
 
@@ -26,6 +86,12 @@ class AppMenuBar(QtWidgets.QMenuBar):
         self.save.setShortcut(QtGui.QKeySequence.StandardKey.Save)
         file_menu.addAction(self.save)
 
+        # add 'save as' button to file menu
+        self.save_as = QtGui.QAction("Save As")
+        self.save_as.triggered.connect(self.on_save_as)
+        self.save_as.setShortcut(QtGui.QKeySequence.StandardKey.SaveAs)
+        file_menu.addAction(self.save_as)
+
         self.addSeparator()
 
         # add 'open' button to file menu
@@ -34,45 +100,473 @@ class AppMenuBar(QtWidgets.QMenuBar):
         self.open.setShortcut(QtGui.QKeySequence.StandardKey.Open)
         file_menu.addAction(self.open)
 
+        # add 'open folder' button to file menu
+        self.open_folder = QtGui.QAction("Open Folder...")
+        self.open_folder.triggered.connect(self.on_open_folder)
+        file_menu.addAction(self.open_folder)
+
+        # add 'merge' button to file menu
+        self.merge = QtGui.QAction("Merge Files...")
+        self.merge.triggered.connect(self.on_merge)
+        file_menu.addAction(self.merge)
+
         # add 'close' button to file menu
         self.close_file = QtGui.QAction("Close")
         self.close_file.triggered.connect(self.on_close)
         self.close_file.setShortcut(QtGui.QKeySequence.StandardKey.Close)
         file_menu.addAction(self.close_file)
-    
+
+        edit_menu = self.addMenu("Edit")
+
+        # add 'undo' and 'redo' buttons to edit menu
+        # they are connected to the app in main.py, and are enabled when there is an edit to undo or redo
+        self.undo = QtGui.QAction("Undo")
+        self.undo.setShortcut(QtGui.QKeySequence.StandardKey.Undo)
+        self.undo.setEnabled(False)
+        edit_menu.addAction(self.undo)
+
+        self.redo = QtGui.QAction("Redo")
+        self.redo.setShortcut(QtGui.QKeySequence.StandardKey.Redo)
+        self.redo.setEnabled(False)
+        edit_menu.addAction(self.redo)
+
+        edit_menu.addSeparator()
+
+        # add buttons that change every task selected in the task list
+        # they are connected to the app in main.py, and are enabled when at least one task is selected
+        self.complete_selected = QtGui.QAction("Mark Selected as Complete")
+        edit_menu.addAction(self.complete_selected)
+
+        self.delete_selected = QtGui.QAction("Delete Selected")
+        edit_menu.addAction(self.delete_selected)
+
+        self.priority_menu = edit_menu.addMenu("Set Priority of Selected")
+        self.priority_actions: dict[TaskPriority, QtGui.QAction] = {}
+        for priority in TaskPriority:
+            self.priority_actions[priority] = self.priority_menu.addAction(priority.name.replace("_", " ").title())
+
+        self.set_class = QtGui.QAction("Set Class of Selected...")
+        edit_menu.addAction(self.set_class)
+
+        self.set_selection_state(0)
+
+    # enables the undo and redo buttons when there is an edit to undo or redo
+    def set_history_state(self, can_undo: bool, can_redo: bool):
+        self.undo.setEnabled(can_undo)
+        self.redo.setEnabled(can_redo)
+
+    # enables the buttons that change the selected tasks when at least one task is selected
+    def set_selection_state(self, selected_count: int):
+        for action in [self.complete_selected, self.delete_selected, self.set_class]:
+            action.setEnabled(selected_count > 0)
+        self.priority_menu.setEnabled(selected_count > 0)
+
     # callback for save button
-    # will save the tasks to a file when the user selected a save location
+    # appends the changes made since the last save to the open task file's journal
+    # prompts the user for a save location if no task file is open
+    @traced
     def on_save(self):
+        self.flush_requested.emit()
+
+        # changes to a task database are written as they are made
+        if isinstance(self.tasks, SqliteTaskStore):
+            self.tasks.commit()
+            self.tasks_saved.emit(self.tasks.path)
+            return
+
+        if self.journal is None:
+            self.on_save_as()
+            return
+
+        # ? existence check: nothing has changed since the last save, so the file isn't touched
+        if not self.journal.is_dirty():
+            return
+
+        self.flush_journal()
+
+    # writes the journal's dirty tasks to the task file, returns False if the file couldn't be written
+    # ! only the changed tasks are written, so this is fast enough to run on the GUI thread
+    def flush_journal(self) -> bool:
+        try:
+            self.journal.flush()
+        except:
+            ErrorMessage("Unable to save tasks", "Unable to write to the task file. Please ensure that the file location is writable.")
+            return False
+
+        self.tasks_saved.emit(self.journal.path)
+
+        # compacting runs in the background, so a failure is reported by the next save
+        # ! the changes are still in the journal, so nothing has been lost
+        if not self.journal.take_compact_error() is None:
+            ErrorMessage("Unable to compact task file", "The task file could not be rewritten, so your changes are still stored in its journal file. Please ensure that the file location is writable.")
+
+        return True
+
+    # checks if the tasks have changed since they were last saved or loaded
+    def has_changes(self) -> bool:
+        # changes to a task database are written as they are made
+        if isinstance(self.tasks, TaskStore):
+            return False
+
+        if self.journal is None:
+            return self.modified
+
+        return self.journal.is_dirty()
+
+    # callback for save as button
+    # will save all tasks to a file when the user selected a save location
+    @traced
+    def on_save_as(self):
+        self.flush_requested.emit()
+
         # prompt user for save location
         file_dialog = QtWidgets.QFileDialog()
         file_dialog.setWindowTitle("Save tasks to file")
         file_dialog.setDefaultSuffix(".tsk")
-        path, _ = QtWidgets.QFileDialog.getSaveFileName()
+        path, name_filter = QtWidgets.QFileDialog.getSaveFileName(filter=SAVE_FILTERS)
+
+        # ? existence check: the path is empty if the dialog was cancelled
+        if path != "":
+            if path.endswith(".db") or name_filter == DATABASE_FILTER:
+                self.save_database(path)
+                return
 
-        if not path is None:
             # append the task file extension to the path
-            save_tasks(path + ".tsk", self.tasks)
+            path = add_task_file_extension(path, name_filter)
+
+            # the open file may still be compacting in the background, and may be the file being saved over
+            # ! both write to the same temporary file before replacing the task file, so the compaction has to finish first
+            if not self.journal is None:
+                self.journal.wait_for_compaction()
+
+            # the tasks are given ids on the GUI thread, then encoded and written by a worker
+            self.pending_journal = TaskJournal(path)
+            self.pending_items = self.pending_journal.reset(self.tasks)
+
+            # the file may be saved over the open indexed file, which can't be replaced on Windows while it is mapped
+            # ! reset has already decoded every task, so this only closes the file
+            if isinstance(self.tasks, LazyTaskList):
+                self.tasks.detach()
+
+            self.saving_journal = self.pending_journal
+
+            worker = Worker(self.pending_journal.write_all, self.pending_items)
+            worker.signals.finished.connect(self.on_save_finished)
+            worker.signals.failed.connect(self.on_save_failed)
+            self.start_worker(worker, "Saving tasks...", False)
+
+    # callbacks for when a worker has finished saving tasks
+    @traced
+    def on_save_finished(self, _):
+        self.finish_worker()
+        self.saving_journal = None
+
+        if isinstance(self.tasks, TaskStore):
+            # the saved task file replaces the task database as the open file
+            # tasks that were added or removed while saving are in the journal's dirty tasks, so they are added to or removed from the list
+            dirty = self.pending_journal.dirty
+            saved_ids = {task_id for task_id, _ in self.pending_items}
+            tasks = [task for task_id, task in self.pending_items if not (task_id in dirty and dirty[task_id] is None)]
+            tasks += [task for task_id, task in dirty.items() if not task is None and not task_id in saved_ids]
+
+            self.set_tasks(tasks, self.pending_journal)
+        else:
+            self.journal = self.pending_journal
+            self.modified = False
+
+        self.tasks_saved.emit(self.journal.path)
+        self.finish_close()
+
+    def on_save_failed(self, error: Exception):
+        self.finish_worker()
+        self.saving_journal = None
+        self.close_after_save = False
+        ErrorMessage("Unable to save tasks", "Unable to write to selected file location. Please ensure that the file location is valid and writable.")
+
+    # writes the tasks to a new task database, which becomes the open file
+    def save_database(self, path: str):
+        if not path.endswith(".db"):
+            path += ".db"
+
+        self.pending_path = path
+
+        # ! a copy of the list is written so tasks can still be added and removed while saving
+        # the tasks keep their ids as their row ids in the database
+        worker = Worker(export_tasks, path, list(self.tasks), True)
+        worker.signals.finished.connect(self.on_database_saved)
+        worker.signals.failed.connect(self.on_save_failed)
+        self.start_worker(worker, "Saving tasks...", False)
+
+    def on_database_saved(self, _):
+        self.finish_worker()
+        self.open_database(self.pending_path)
+        self.tasks_saved.emit(self.pending_path)
+        self.finish_close()
 
     # callback for open button
     # will load tasks from a user selected file
+    @traced
     def on_open(self):
         file_dialog = QtWidgets.QFileDialog()
         file_dialog.setWindowTitle("Load tasks from file")
         file_dialog.setFileMode(QtWidgets.QFileDialog.FileMode.ExistingFile)
-        file_dialog.setNameFilters(["Task Files (*.tsk)", "All Files (*)"])
+        file_dialog.setNameFilters(OPEN_FILTERS.split(";;"))
 
         if file_dialog.exec():
-            # prompt user to select file, pass file path to load_tasks()
+            # prompt user to select file, the file is loaded by a worker
             path = file_dialog.selectedFiles()
-            loaded_tasks = load_tasks(path[0])
-            
-            # refuse to load tasks if load_tasks failed
-            if not loaded_tasks is None:
-                self.tasks = loaded_tasks
-                self.tasks_loaded.emit()
+            self.open_file(path[0])
+
+    # opens a task file or task database
+    def open_file(self, path: str):
+        # task databases are read a page at a time as the tasks are shown, so they open immediately
+        if path.endswith(".db"):
+            self.open_database(path)
+            return
+
+        # the journal replays any changes that were saved after the file was last written in full
+        self.pending_journal = TaskJournal(path)
+
+        # indexed files are opened without decoding their tasks, so they open immediately however many tasks they have
+        try:
+            tasks = self.pending_journal.load_lazy()
+        except Exception as error:
+            self.on_load_failed(error)
+            return
+
+        if not tasks is None:
+            self.set_tasks(tasks, self.pending_journal)
+            return
+
+        worker = Worker(load_file_indexed, self.pending_journal)
+        worker.signals.finished.connect(self.on_load_finished)
+        worker.signals.failed.connect(self.on_load_failed)
+        worker.signals.cancelled.connect(self.finish_worker)
+        self.start_worker(worker, "Loading tasks...", True)
+
+    # callbacks for when a worker has finished loading tasks
+    @traced
+    def on_load_finished(self, result: tuple[list[Task], SearchIndex, FilterIndex]):
+        self.finish_worker()
+
+        tasks, search_index, filter_index = result
+        self.set_tasks(tasks, self.pending_journal, search_index, filter_index)
+
+    def on_load_failed(self, error: Exception):
+        self.finish_worker()
+
+        if isinstance(error, OSError):
+            ErrorMessage("Unable to open file", "Unable to open file, please make sure it exists")
+        else:
+            ErrorMessage("Unable to load task file", "Selected task file could not be loaded because it is invald. Check if you have selected the correct file and that the file has not been corrupted.")
+
+    # callback for open folder button
+    # loads every task file in a user selected folder into one task list
+    @traced
+    def on_open_folder(self):
+        directory = QtWidgets.QFileDialog.getExistingDirectory(caption="Load tasks from folder")
+
+        # ? existence check: the path is empty if the dialog was cancelled
+        if directory == "":
+            return
+
+        try:
+            paths = find_task_files(directory)
+        except OSError:
+            ErrorMessage("Unable to open folder", "Unable to read the selected folder, please make sure it exists.")
+            return
+
+        if len(paths) == 0:
+            ErrorMessage("Unable to open folder", "The selected folder doesn't contain any task files.")
+            return
+
+        # ! the files are decoded in parallel by a process pool, started from the worker so the window stays responsive
+        worker = Worker(load_folder_indexed, paths)
+        worker.signals.finished.connect(self.on_folder_loaded)
+        worker.signals.failed.connect(self.on_load_failed)
+        worker.signals.cancelled.connect(self.finish_worker)
+        self.start_worker(worker, "Loading tasks...", True)
+
+    # callback for when a worker has finished loading a folder
+    # the tasks from every file are shown as one list, which isn't saved to any of the files
+    @traced
+    def on_folder_loaded(self, result: tuple[list[Task], dict[str, Exception], SearchIndex, FilterIndex]):
+        self.finish_worker()
+
+        tasks, errors, search_index, filter_index = result
+        self.set_tasks(tasks, None, search_index, filter_index)
+
+        # the files that couldn't be loaded are listed once the other files have been shown
+        if len(errors) > 0:
+            names = "\n".join(os.path.basename(path) for path in errors)
+            ErrorMessage("Unable to load some task files", f"The following task files could not be loaded because they are invalid or could not be read:\n{names}")
+
+    # callback for merge button
+    # combines several task files into a new file without duplicate tasks, then opens the new file
+    @traced
+    def on_merge(self):
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(caption="Select task files to merge", filter=OPEN_FILTERS)
+
+        # ? existence check: the list is empty if the dialog was cancelled
+        if len(paths) == 0:
+            return
+
+        path, name_filter = QtWidgets.QFileDialog.getSaveFileName(caption="Save merged tasks to file", filter=SAVE_FILTERS)
+
+        if path == "":
+            return
+
+        if name_filter == DATABASE_FILTER and not path.endswith(".db"):
+            path += ".db"
+        elif not path.endswith(".db"):
+            path = add_task_file_extension(path, name_filter)
+
+        # ? existence check: writing to one of the merged files would overwrite its tasks before they have been read
+        if os.path.abspath(path) in (os.path.abspath(merged_path) for merged_path in paths):
+            ErrorMessage("Unable to merge files", "The merged tasks can't be saved to one of the files being merged. Please choose a different file.")
+            return
+
+        self.pending_path = path
+
+        # ! the files are merged by streaming them through a sort, so large files aren't loaded into memory
+        worker = Worker(merge_task_files, paths, path)
+        worker.signals.finished.connect(self.on_merge_finished)
+        worker.signals.failed.connect(self.on_merge_failed)
+        worker.signals.cancelled.connect(self.finish_worker)
+        self.start_worker(worker, "Merging tasks...", True)
+
+    # callbacks for when a worker has finished merging task files
+    def on_merge_finished(self, _):
+        self.finish_worker()
+        self.open_file(self.pending_path)
+
+    def on_merge_failed(self, error: Exception):
+        self.finish_worker()
+
+        if isinstance(error, OSError):
+            ErrorMessage("Unable to merge files", "Unable to read the selected files or write the merged file. Please make sure the files exist and the save location is writable.")
+        else:
+            ErrorMessage("Unable to merge files", "One of the selected task files could not be loaded because it is invalid. Check if you have selected the correct files and that they have not been corrupted.")
+
+    # runs a worker in the background and shows its progress
+    # the file actions are disabled until the worker has finished, so only one file is loaded or saved at a time
+    def start_worker(self, worker: Worker, message: str, can_cancel: bool):
+        self.worker = worker
+        self.set_file_actions_enabled(False)
+
+        # the progress dialog is only shown if the worker takes longer than half a second
+        self.progress_dialog = QtWidgets.QProgressDialog(message, "Cancel", 0, 100, self.window())
+        self.progress_dialog.setWindowTitle("Homework Organiser")
+        self.progress_dialog.setMinimumDuration(500)
+        if not can_cancel:
+            self.progress_dialog.setCancelButton(None)
+        self.progress_dialog.canceled.connect(worker.cancel)
+        worker.signals.progress.connect(self.progress_dialog.setValue)
+
+        worker.start()
+
+    # hides the progress dialog and re-enables the file actions
+    def finish_worker(self):
+        self.worker = None
+        self.set_file_actions_enabled(True)
+
+        self.progress_dialog.reset()
+        self.progress_dialog.deleteLater()
+
+    def set_file_actions_enabled(self, enabled: bool):
+        for action in [self.save, self.save_as, self.open, self.open_folder, self.merge, self.close_file]:
+            action.setEnabled(enabled)
     
     # callback for close button
-    # will clear the task list
+    # will clear the task list, asking to save the tasks first if they have changed
+    # ! nothing is written if the tasks haven't changed since they were last saved
+    @traced
     def on_close(self):
-        self.tasks = []
-        self.tasks_loaded.emit()
\ No newline at end of file
+        self.flush_requested.emit()
+
+        if self.has_changes():
+            answer = QtWidgets.QMessageBox.question(
+                self.window(), "Homework Organiser", "The tasks have been changed. Do you want to save them before closing?",
+                QtWidgets.QMessageBox.StandardButton.Save | QtWidgets.QMessageBox.StandardButton.Discard | QtWidgets.QMessageBox.StandardButton.Cancel
+            )
+
+            if answer == QtWidgets.QMessageBox.StandardButton.Cancel:
+                return
+
+            if answer == QtWidgets.QMessageBox.StandardButton.Save:
+                # tasks that haven't been saved to a file are closed once the worker has saved them
+                if self.journal is None:
+                    self.close_after_save = True
+                    self.on_save_as()
+
+                    # ? existence check: the save dialog was cancelled
+                    if self.worker is None:
+                        self.close_after_save = False
+                    return
+
+                if not self.flush_journal():
+                    return
+
+        self.set_tasks([], None)
+
+    # closes the tasks once they have been saved, if they were being saved because the close button was pressed
+    # tasks that were changed while saving are written before the tasks are closed
+    def finish_close(self):
+        if self.close_after_save:
+            self.close_after_save = False
+
+            if self.has_changes() and not self.flush_journal():
+                return
+
+            self.set_tasks([], None)
+
+    # opens a task database and shows its tasks
+    @traced
+    def open_database(self, path: str):
+        try:
+            self.set_tasks(SqliteTaskStore(path), None)
+        except:
+            ErrorMessage("Unable to open file", "Selected task database could not be opened. Check if you have selected the correct file and that the file has not been corrupted.")
+
+    # replaces the task list, closing the task database or indexed task file that was open
+    # search_index and filter_index are the indexes of the tasks if they were built while the tasks were loaded
+    @traced
+    def set_tasks(self, tasks: list[Task] | TaskStore | LazyTaskList, journal: TaskJournal | None, search_index: SearchIndex | None = None, filter_index: FilterIndex | None = None):
+        if isinstance(self.tasks, (TaskStore, LazyTaskList)):
+            self.tasks.close()
+
+        self.tasks = tasks
+        self.search_index = search_index
+        self.filter_index = filter_index
+        self.journal = journal
+        self.modified = False
+        self.tasks_loaded.emit()
+
+    # returns the journals that changes to the tasks are recorded in
+    # the open task file's journal and the journal of the file being written by save as, if there is one
+    def get_journals(self) -> list[TaskJournal]:
+        return [journal for journal in (self.journal, self.saving_journal) if not journal is None]
+
+    # callbacks for when a task is changed in the app
+    # changes are recorded in the journal and written when the tasks are saved
+
+    def on_task_added(self, task: Task):
+        self.modified = True
+        for journal in self.get_journals():
+            journal.record_created(task)
+
+    def on_tasks_changed(self, tasks: list[Task]):
+        self.modified = True
+        for journal in self.get_journals():
+            for task in tasks:
+                journal.record_updated(task)
+
+        # tasks added to or removed from a task database are written by the task list
+        # changes to tasks' fields are written here, in one transaction
+        if isinstance(self.tasks, TaskStore):
+            self.tasks.update_many(tasks)
+
+    def on_task_removed(self, task: Task):
+        self.modified = True
+        for journal in self.get_journals():
+            journal.record_deleted(task)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import heapq
+import math
+from datetime import datetime
+from itertools import count
+
+from PySide6 import QtCore
+
+from task import *
+from tracing import traced
+
+# ? Data types:
+# ?     - OverdueScheduler: tracks when each incomplete task becomes overdue and signals the rest of the program at that moment
+# ?     - QTimer: a single timer is set for the next due date, instead of checking every task on a regular interval
+# ? Data structures:
+# ?     - list[tuple[datetime, int, Task]]: min-heap of due dates, the earliest due date is always at the front. The int breaks ties
+# ?       between tasks due at the same time so tasks are never compared
+# ?     - dict[Task, datetime]: the due date each incomplete task is scheduled for. Heap entries that don't match are out of date and skipped
+# ?     - set[Task]: the incomplete tasks that are overdue
+
+# the longest interval a QTimer supports, in milliseconds
+# ! the timer fires early for due dates further away than this, finds nothing is due and is set again
+MAX_TIMER_INTERVAL = 2**31 - 1
+# the number of out of date heap entries allowed before the heap is rebuilt
+MIN_STALE_ENTRIES = 64
+
+# emits task_became_overdue when an incomplete task's due date passes
+# ! only the front of the heap is checked, so the cost doesn't depend on the number of tasks
+class OverdueScheduler(QtCore.QObject):
+    task_became_overdue = QtCore.Signal(Task)
+
+    def __init__(self, tasks=()):
+        super().__init__()
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.check_deadlines)
+
+        self.counter = count()
+        self.heap: list[tuple[datetime, int, Task]] = []
+        self.deadlines: dict[Task, datetime] = {}
+        self.overdue: set[Task] = set()
+
+        self.set_tasks(tasks)
+
+    # replaces the tasks being tracked, e.g. when a file is opened
+    # tasks that are already overdue are marked as overdue without emitting the signal
+    @traced
+    def set_tasks(self, tasks):
+        # ! the sets are cleared rather than replaced so the task list can keep a reference to the overdue set
+        self.deadlines.clear()
+        self.overdue.clear()
+
+        now = datetime.now()
+        for task in tasks:
+            if task.is_complete():
+                continue
+
+            if task.get_due_date() <= now:
+                self.overdue.add(task)
+            else:
+                self.deadlines[task] = task.get_due_date()
+
+        self.rebuild()
+
+    # rebuilds the heap from the scheduled due dates, removing out of date entries
+    def rebuild(self):
+        self.heap = [(due_date, next(self.counter), task) for task, due_date in self.deadlines.items()]
+        heapq.heapify(self.heap)
+
+        self.start_timer()
+
+    # reschedules a task after it has been added or changed (e.g. by set_due_date or set_completed)
+    # the task's old heap entry is left in the heap and skipped once it reaches the front
+    @traced
+    def update_task(self, task: Task):
+        self.schedule_task(task)
+        self.remove_stale_entries()
+
+    # reschedules several tasks that were changed together, the timer is only restarted once
+    @traced
+    def update_tasks(self, tasks: list[Task]):
+        for task in tasks:
+            self.schedule_task(task)
+
+        self.remove_stale_entries()
+
+    # the signal is only emitted for tasks that weren't already overdue, so changing the title of an overdue task doesn't emit it again
+    def schedule_task(self, task: Task):
+        was_overdue = task in self.overdue
+        self.overdue.discard(task)
+        self.deadlines.pop(task, None)
+
+        if not task.is_complete():
+            if task.get_due_date() <= datetime.now():
+                self.overdue.add(task)
+                if not was_overdue:
+                    self.task_became_overdue.emit(task)
+            else:
+                self.deadlines[task] = task.get_due_date()
+                heapq.heappush(self.heap, (task.get_due_date(), next(self.counter), task))
+
+    # starts tracking a task that has just been loaded, without emitting the signal if it is already overdue
+    # ! the timer is only restarted if the task is due before every other task, as this is called for every task that is decoded
+    def add_task(self, task: Task):
+        if task.is_complete():
+            return
+
+        if task.get_due_date() <= datetime.now():
+            self.overdue.add(task)
+            return
+
+        self.deadlines[task] = task.get_due_date()
+        entry = (task.get_due_date(), next(self.counter), task)
+        heapq.heappush(self.heap, entry)
+
+        if self.heap[0] is entry:
+            self.start_timer()
+
+    # stops tracking a task after it has been deleted
+    def remove_task(self, task: Task):
+        self.overdue.discard(task)
+        self.deadlines.pop(task, None)
+
+        self.remove_stale_entries()
+
+    # rebuilds the heap once most of its entries are out of date, otherwise restarts the timer for the front of the heap
+    def remove_stale_entries(self):
+        if len(self.heap) > len(self.deadlines) * 2 + MIN_STALE_ENTRIES:
+            self.rebuild()
+        else:
+            self.start_timer()
+
+    # checks if the front heap entry is still the task's scheduled due date
+    def is_stale(self, entry: tuple[datetime, int, Task]) -> bool:
+        due_date, _, task = entry
+        return self.deadlines.get(task) != due_date
+
+    # sets the timer to fire at the earliest due date
+    def start_timer(self):
+        # skip out of date entries at the front of the heap
+        while len(self.heap) > 0 and self.is_stale(self.heap[0]):
+            heapq.heappop(self.heap)
+
+        # ? existence check: no incomplete tasks are due in the future
+        if len(self.heap) == 0:
+            self.timer.stop()
+            return
+
+        delay = (self.heap[0][0] - datetime.now()).total_seconds() * 1000
+        self.timer.start(min(max(math.ceil(delay), 0), MAX_TIMER_INTERVAL))
+
+    # timer callback
+    # marks every task whose due date has passed as overdue
+    @traced
+    def check_deadlines(self):
+        now = datetime.now()
+
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self.is_stale(entry):
+                continue
+
+            task = entry[2]
+            del self.deadlines[task]
+            self.overdue.add(task)
+            self.task_became_overdue.emit(task)
+
+        self.start_timer()
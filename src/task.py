@@ -10,13 +10,23 @@ class TaskPriority(IntEnum):
     VERY_HIGH = 3
 
 class Task:
+    # called with the task, the name of the field and its old value whenever a setter changes a field, see task_changes.py
+    # ! fields set directly (e.g. when a task is loaded) aren't reported. None when nothing is listening, e.g. in task_cli.py
+    observer = None
+
+    # ! slots are used instead of a per-task __dict__, which greatly reduces the memory used by each task
+    # __weakref__ is needed so task databases can keep weak references to tasks
+    __slots__ = ("id", "title", "due_date", "class_name", "completed", "priority", "__weakref__")
+
     def __init__(self, title: str, due_date: datetime, class_name: str, priority: TaskPriority):
-        print(type(due_date))
         # type check
         assert(isinstance(due_date, datetime))
         # existence check
         assert(not priority is None)
 
+        # a unique id that stays the same when the task list is sorted or tasks are removed, None until the task is added to a task list
+        # ! the id is saved with the task, so it is the same each time the file is opened (see task_map.py)
+        self.id: int | None = None
         self.title = title
         self.due_date = due_date
         self.class_name = class_name
@@ -26,19 +36,31 @@ class Task:
     def __str__(self) -> str:
         return f"{self.title} {self.due_date.strftime("%d/%m/%y")} {self.class_name} {str(self.priority)} {str(self.completed)}"
 
+    # sets a field and reports the change to the observer
+    # ? existence check: setting a field to the value it already has isn't a change
+    def set_field(self, field: str, value):
+        old = getattr(self, field)
+        if old == value:
+            return
+
+        setattr(self, field, value)
+
+        if not Task.observer is None:
+            Task.observer(self, field, old)
+
     # getters and setters
     
     def is_complete(self) -> bool:
         return self.completed
 
     def set_completed(self, complete: bool):
-        self.completed = complete
+        self.set_field("completed", complete)
 
     def complete_task(self):
-        self.completed = True
+        self.set_field("completed", True)
     
     def uncomplete_task(self):
-        self.completed = False
+        self.set_field("completed", False)
     
     
     def is_overdue(self) -> bool:
@@ -48,25 +70,25 @@ class Task:
         return self.due_date
 
     def set_due_date(self, new_date: datetime):
-        self.due_date = new_date
+        self.set_field("due_date", new_date)
     
 
     def get_priority(self) -> TaskPriority:
         return self.priority
     
     def set_priority(self, new_priority: TaskPriority):
-        self.priority = new_priority
+        self.set_field("priority", new_priority)
     
 
     def get_title(self) -> str:
         return self.title
     
     def set_title(self, new_title: str):
-        self.title = new_title
+        self.set_field("title", new_title)
     
     
     def get_class(self) -> str:
         return self.class_name
 
     def set_class(self, new_class: str):
-        self.class_name = new_class
+        self.set_field("class_name", new_class)
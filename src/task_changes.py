@@ -0,0 +1,64 @@
+from PySide6 import QtCore
+
+from task import *
+from tracing import traced
+
+# ? Collects the changes made to tasks' fields and reports them once per turn of the event loop
+# ? so an action that changes many fields (or many tasks) repaints, re-indexes and saves each task once
+# ? Data types:
+# ?     - str: the name of a changed field, e.g. "title" or "completed"
+# ? Data structures:
+# ?     - dict[Task, dict[str, object]]: the tasks changed since the last batch, and the value each changed field had before the batch
+# ?       a field that is changed more than once keeps the value it had before its first change
+
+# reports the changes made by Task setters in batches
+# ! only one notifier receives changes at a time, as Task.observer is shared by every task
+class TaskChangeNotifier(QtCore.QObject):
+    # emitted with the batch of changes, see the dict above
+    tasks_changed = QtCore.Signal(object)
+
+    def __init__(self):
+        super().__init__()
+
+        self.pending: dict[Task, dict[str, object]] = {}
+
+        # ! a zero interval timer fires once the events that are already queued have been handled
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.flush)
+
+        Task.observer = self.on_field_changed
+
+    # called by Task.set_field
+    def on_field_changed(self, task: Task, field: str, old):
+        fields = self.pending.get(task)
+        if fields is None:
+            fields = self.pending[task] = {}
+
+        fields.setdefault(field, old)
+
+        if not self.timer.isActive():
+            self.timer.start()
+
+    # reports the pending changes straight away, e.g. before a task is removed or the tasks are saved
+    # fields that were changed back to the value they had before the batch are left out
+    @traced
+    def flush(self):
+        self.timer.stop()
+
+        # ? existence check: nothing has changed since the last batch
+        if len(self.pending) == 0:
+            return
+
+        pending = self.pending
+        self.pending = {}
+
+        batch = {}
+        for task, fields in pending.items():
+            changed = {field: old for field, old in fields.items() if getattr(task, field) != old}
+            if len(changed) > 0:
+                batch[task] = changed
+
+        if len(batch) > 0:
+            self.tasks_changed.emit(batch)
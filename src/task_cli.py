@@ -0,0 +1,143 @@
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from task import *
+from task_sort import *
+from task_stream import *
+
+# ? Command line tool for working with task files without the GUI, e.g.
+# ?     python task_cli.py count homework.tsk --overdue
+# ?     python task_cli.py filter homework.tsk --class Maths --due-before 2025-09-01 -o maths.tsk
+# ?     python task_cli.py sort homework.tsk --by due -o sorted.tsk
+# ?     python task_cli.py convert old.tsk new.db
+# ?     python task_cli.py merge term1.tsk term2.tsk students.db -o all.tsk
+# ? Tasks are streamed from the input to the output one at a time, so large files are never loaded into memory all at once
+# ! only modules that don't use Qt are imported, so the tool starts quickly and works on machines without a display
+# ? Data sources
+# ?     - task file (.tsk), task database (.db) or standard input ("-"): the tasks to process
+# ? Data types:
+# ?     - generator: tasks are passed between each step (reading, filtering, sorting, writing) as generators, see task_stream.py
+# ?     - function: each filter option is converted into a function that checks a single task
+
+# the names used for each sort type and priority on the command line
+SORT_TYPES = {
+    "name": SortType.NAME,
+    "class": SortType.CLASS,
+    "due": SortType.DUEDATE,
+    "priority": SortType.PRIORITY,
+}
+PRIORITY_NAMES = {priority.name.lower(): priority for priority in TaskPriority}
+
+# converts the filter options into a single function that checks if a task should be kept
+def get_filter(args: argparse.Namespace):
+    conditions = []
+
+    if args.class_names:
+        class_names = set(args.class_names)
+        conditions.append(lambda task: task.class_name in class_names)
+    if args.priorities:
+        priorities = {PRIORITY_NAMES[priority] for priority in args.priorities}
+        conditions.append(lambda task: task.priority in priorities)
+    if args.due_from:
+        conditions.append(lambda task: task.due_date >= args.due_from)
+    if args.due_before:
+        conditions.append(lambda task: task.due_date < args.due_before)
+    if args.completed:
+        conditions.append(lambda task: task.completed)
+    if args.incomplete:
+        conditions.append(lambda task: not task.completed)
+    if args.overdue:
+        # the time is read once, so every task is compared to the same time
+        now = datetime.now()
+        conditions.append(lambda task: not task.completed and task.due_date < now)
+    if args.search:
+        from task_index import SearchIndex
+        matches = SearchIndex().matches
+        conditions.append(lambda task: matches(task, args.search))
+
+    return lambda task: all(condition(task) for condition in conditions)
+
+# adds the options used to filter tasks to a command
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--class", dest="class_names", action="append", metavar="CLASS", help="only tasks in this class (can be repeated)")
+    parser.add_argument("--priority", dest="priorities", action="append", choices=PRIORITY_NAMES, help="only tasks with this priority (can be repeated)")
+    parser.add_argument("--due-from", type=datetime.fromisoformat, metavar="DATE", help="only tasks due on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--due-before", type=datetime.fromisoformat, metavar="DATE", help="only tasks due before this date (YYYY-MM-DD)")
+    parser.add_argument("--search", metavar="TEXT", help="only tasks whose title or class contains words starting with each word in TEXT")
+
+    completion = parser.add_mutually_exclusive_group()
+    completion.add_argument("--completed", action="store_true", help="only completed tasks")
+    completion.add_argument("--incomplete", action="store_true", help="only incomplete tasks")
+    completion.add_argument("--overdue", action="store_true", help="only incomplete tasks that are past their due date")
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Filter, sort, count and convert task files without opening the app.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    count_parser = commands.add_parser("count", help="print the number of tasks, e.g. count --overdue")
+    count_parser.add_argument("input", help="task file (.tsk), task database (.db) or - for standard input")
+    add_filter_arguments(count_parser)
+
+    filter_parser = commands.add_parser("filter", help="write the tasks matching the filter options")
+    filter_parser.add_argument("input", help="task file (.tsk), task database (.db) or - for standard input")
+    filter_parser.add_argument("-o", "--output", default="-", help="output file (.tsk, .db or .csv), standard output if not given")
+    add_filter_arguments(filter_parser)
+
+    sort_parser = commands.add_parser("sort", help="write the tasks in sorted order")
+    sort_parser.add_argument("input", help="task file (.tsk), task database (.db) or - for standard input")
+    sort_parser.add_argument("-o", "--output", default="-", help="output file (.tsk, .db or .csv), standard output if not given")
+    sort_parser.add_argument("--by", choices=SORT_TYPES, default="name", help="the field to sort by, the other fields break ties")
+    sort_parser.add_argument("--descending", action="store_true", help="sort the field in descending order")
+    add_filter_arguments(sort_parser)
+
+    convert_parser = commands.add_parser("convert", help="convert between formats, chosen by the file extensions (.tsk, .db or .csv)")
+    convert_parser.add_argument("input", help="task file (.tsk, version 1 or 2), task database (.db) or - for standard input")
+    convert_parser.add_argument("output", help="output file (.tsk, .db or .csv) or - for standard output")
+
+    merge_parser = commands.add_parser("merge", help="combine several task files into one, removing tasks with the same title, class and due date")
+    merge_parser.add_argument("inputs", nargs="+", metavar="input", help="task files (.tsk) or task databases (.db), the first copy of a duplicate task is kept")
+    merge_parser.add_argument("-o", "--output", default="-", help="output file (.tsk, .db or .csv), standard output if not given")
+    merge_parser.add_argument("--by", choices=SORT_TYPES, default="name", help="the field to sort the merged tasks by, the other fields break ties")
+    merge_parser.add_argument("--descending", action="store_true", help="sort the field in descending order")
+
+    return parser
+
+def main(argv: list[str] | None = None) -> int:
+    args = get_parser().parse_args(argv)
+
+    # ? existence check: reading and writing the same file would overwrite the tasks before they have been read
+    inputs = args.inputs if args.command == "merge" else [args.input]
+    output = getattr(args, "output", None)
+    if not output in (None, "-") and os.path.abspath(output) in (os.path.abspath(path) for path in inputs):
+        print("error: the output file must be different to the input files", file=sys.stderr)
+        return 1
+
+    try:
+        if args.command == "merge":
+            read_count, write_count = merge_task_files(args.inputs, args.output, SORT_TYPES[args.by], args.descending)
+            print(f"merged {read_count} tasks, removed {read_count - write_count} duplicates", file=sys.stderr)
+            return 0
+
+        tasks = read_task_file(args.input)
+
+        if args.command != "convert":
+            tasks = filter(get_filter(args), tasks)
+
+        match args.command:
+            case "count":
+                print(sum(1 for _ in tasks))
+            case "filter" | "convert":
+                write_task_file(args.output, tasks)
+            case "sort":
+                keys = get_sort_keys(SORT_TYPES[args.by], args.descending)
+                write_task_file(args.output, sort_task_stream(tasks, keys))
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
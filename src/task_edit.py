@@ -1,26 +1,32 @@
 from datetime import datetime
 import calendar
+import functools
 
 from PySide6 import QtWidgets
 from PySide6 import QtCore
 from PySide6.QtCore import Qt
 
 from task import *
+from history import task_values, TASK_VALUE_FIELDS
 from utils import *
+from tracing import traced
 
 # ? Data types:
-# ?     - int: used as an index when iterating over lists, used to keep track of the task being edited's position in the main task list
+# ?     - int: used as an index when iterating over lists, the id of the task being edited is sent to the rest of the program (see task_map.py)
 # ?     - str: used to store text that will be displayed to the user in the GUI
 # ?     - datetime: used to store user-inputted dates easily 
 # ?     - TaskPriority: used to allow different task priorities to be represented using a finite number of values (i.e as an Enum)
 # ?     - TaskEdit: used to represent the entire task editing part of the GUI, creates and stores all widgets used in this part of the GUI
 # ?     - DatePicker: used to represent a self-contained date picker widget. Creates and stores all widgets used for the take picker part of the GUI
 # ? Data structures:
+# ?     - tuple[str, ...]: the items of a combo box, cached so the same items are never built twice
+# ?     - dict: used to look up the cached items of the day combo box for each number of days, and the items shown in each combo box
 # ?     - list: was used because it provides a method of storing data (Like text for combo boxes and days of the month) in a way that allows more items to be added and sorted
 
 class TaskEdit(QtWidgets.QVBoxLayout):
     # define Qt signals
-    updated = QtCore.Signal()
+    # tasks are referred to by their id, which doesn't change when the task list is sorted or tasks are removed
+    # ! edits to a task's fields aren't signalled, they are reported by the task itself (see task_changes.py)
     created = QtCore.Signal(Task)
     deleted = QtCore.Signal(int)
 
@@ -29,7 +35,6 @@ class TaskEdit(QtWidgets.QVBoxLayout):
         super().setAlignment(Qt.AlignmentFlag.AlignTop)
 
         self.selected_task = None
-        self.task_index = None
 
         self.title = QtWidgets.QLabel('<h1>Task Title</h1>')
         super().addWidget(self.title)
@@ -97,14 +102,20 @@ class TaskEdit(QtWidgets.QVBoxLayout):
 
     # callback for 'mark task as complete' button
     # marks the task as complete
+    @traced
     def on_complete_pressed(self):
         if not self.selected_task is None:
+            # ? existence check: the task is already complete, so nothing has changed
+            if self.selected_task.is_complete():
+                return
+
             self.selected_task.complete_task()
         else:
             ErrorMessage("Unable to mark task as complete", "Please select an existing task to mark it as complete.")
 
     # callback function for 'update/create task' button
     # creates or edits a task in the task list, resets form state
+    @traced
     def update_task(self):
         # ? Existence check
         if not self.selected_task is None:
@@ -112,12 +123,17 @@ class TaskEdit(QtWidgets.QVBoxLayout):
                 ErrorMessage("Unable to Create Task", "Some fields are empty.")
                 return
 
+            old_values = task_values(self.selected_task)
+
             self.selected_task.set_title(self.name_field.text())
             self.selected_task.set_class(self.class_field.text())
             self.selected_task.set_due_date(self.date_picker.selected_date)
 
             match self.priority_combo.currentIndex():
                 case 0:
+                    # put back the fields that were already changed
+                    for field, old in zip(TASK_VALUE_FIELDS[:3], old_values):
+                        self.selected_task.set_field(field, old)
                     ErrorMessage("Unable to Update Task", "Please select a priority.")
                     return
                 case 1:
@@ -129,7 +145,6 @@ class TaskEdit(QtWidgets.QVBoxLayout):
                 case 4:
                     self.selected_task.set_priority(TaskPriority.VERY_HIGH)
 
-            self.updated.emit()
             self.clear_selected_task()
 
         else:
@@ -162,18 +177,19 @@ class TaskEdit(QtWidgets.QVBoxLayout):
             self.clear_selected_task()
 
     # used to remove a task from the task list
+    @traced
     def delete_task(self):
-        # ? type check
-        if isinstance(self.task_index, int):
-            self.deleted.emit(self.task_index)
+        # ? existence check
+        if not self.selected_task is None:
+            self.deleted.emit(self.selected_task.id)
             self.clear_selected_task()
         else:
             ErrorMessage("Unable to Delete Task", "A task must be selected for it to be deleted.")
         
     # public function used to set the selected task based on what the user has selected in the task list
-    def set_selected_task(self, task: Task, index: int):
+    @traced
+    def set_selected_task(self, task: Task):
         self.selected_task = task
-        self.task_index = index
 
         self.name_field.setText(self.selected_task.get_title())
         self.class_field.setText(self.selected_task.get_class())
@@ -183,10 +199,10 @@ class TaskEdit(QtWidgets.QVBoxLayout):
         self.update_btn.setText("Update Task")
     
     # resets the state of the form
+    @traced
     def clear_selected_task(self):
         self.update_btn.setText("Create Task")
         self.selected_task = None
-        self.task_index = None
 
         self.name_field.setText(" ")
         self.name_field.setPlaceholderText("")
@@ -195,11 +211,34 @@ class TaskEdit(QtWidgets.QVBoxLayout):
         self.date_picker.set_date(datetime.now())
     
 
+# names of the months shown in the month combo box, computed once instead of every time the combo boxes change
+MONTH_NAMES = tuple(calendar.month_name[1:])
+# the number of years after the current year that can be selected
+YEAR_COUNT = 10
+# the items of the day combo box for each possible number of days in a month
+# ! months with the same number of days share the same tuple, so the day combo box is only changed when the number of days changes
+DAY_LABELS = {day_count: tuple(str(day) for day in range(1, day_count + 1)) for day_count in range(28, 32)}
+
+# returns the number of days in a month
+# cached as the same few months are looked up every time the date changes
+@functools.cache
+def days_in_month(year: int, month: int) -> int:
+    return calendar.monthrange(year, month)[1]
+
+# returns the items of the year combo box, from the first year up to (but not including) the last year
+@functools.cache
+def year_labels(first_year: int, last_year: int) -> tuple[str, ...]:
+    return tuple(str(year) for year in range(first_year, last_year))
+
 class DatePicker(QtWidgets.QHBoxLayout):
     def __init__(self):
         super().__init__()
 
         self.selected_date = datetime.now()
+        # the first year shown in the year combo box
+        self.first_year = self.selected_date.year
+        # the items currently shown in each combo box, used to skip combo boxes that haven't changed
+        self.combo_items: dict[QtWidgets.QComboBox, tuple[str, ...]] = {}
 
         # initialise combo boxes
         self.year_combo = QtWidgets.QComboBox()   
@@ -218,55 +257,58 @@ class DatePicker(QtWidgets.QHBoxLayout):
         super().addWidget(self.year_combo)
     
     def set_date(self, new_date: datetime):
-        self.selected_date = new_date
-        self.redraw_combos()
-    
-    def redraw_combos(self):
-        # repopulate year combo
-        # * the index changed event needs to be disconnected before the combobox items can be changed
-        # * this prevents a recursion loop from hanging the application
-        self.year_combo.currentIndexChanged.disconnect()
-        self.year_combo.clear()
-
-        # ? RANGE CHECK: prevents the user from selecting a year that is before the current year
-        for year in range(self.selected_date.year, self.selected_date.year + 10):
-            self.year_combo.addItem(str(year))
-        self.year_combo.setCurrentIndex(0)
-        self.year_combo.currentIndexChanged.connect(self.year_changed)
+        # only the date is selected, not the time
+        new_date = datetime(new_date.year, new_date.month, new_date.day)
 
-        # repopulate month combo
-        self.month_combo.currentIndexChanged.disconnect()
-        self.month_combo.clear()
+        # ? existence check: switching to a task with the same due date doesn't change the combo boxes
+        if new_date == self.selected_date:
+            return
 
-        for month in calendar.month_name[1:]:
-            self.month_combo.addItem(month)
-        self.month_combo.setCurrentIndex(self.selected_date.month - 1)
-        self.month_combo.currentIndexChanged.connect(self.month_changed)
-
-        # repopulate day combo
-        self.day_combo.currentIndexChanged.disconnect() 
-        self.day_combo.clear()
+        self.selected_date = new_date
+        self.redraw_combos()
 
+    # updates the combo boxes to show the selected date
+    # ! only combo boxes whose items or selected index have changed are updated
+    @traced
+    def redraw_combos(self):
         # clamp the selected day within the days of the month
-        (_, max_day) = calendar.monthrange(self.selected_date.year, self.selected_date.month)
-        self.selected_date = self.selected_date = datetime(
-            self.selected_date.year, 
-            self.selected_date.month, 
+        max_day = days_in_month(self.selected_date.year, self.selected_date.month)
+        self.selected_date = datetime(
+            self.selected_date.year,
+            self.selected_date.month,
             min(self.selected_date.day, max_day)
         )
 
-        print(f"clamped to {max_day} for month {self.selected_date.month}")
+        # ? RANGE CHECK: prevents the user from selecting a year that is before the current year
+        # the year of a task that is already due in an earlier year is still shown
+        this_year = datetime.now().year
+        self.first_year = min(this_year, self.selected_date.year)
+        last_year = max(this_year + YEAR_COUNT, self.selected_date.year + 1)
+
+        self.set_combo(self.year_combo, year_labels(self.first_year, last_year), self.selected_date.year - self.first_year)
+        self.set_combo(self.month_combo, MONTH_NAMES, self.selected_date.month - 1)
+        self.set_combo(self.day_combo, DAY_LABELS[max_day], self.selected_date.day - 1)
+
+    # shows a list of items in a combo box and selects an index
+    def set_combo(self, combo: QtWidgets.QComboBox, items: tuple[str, ...], index: int):
+        # * signals are blocked while the combo box is changed
+        # * this prevents a recursion loop from hanging the application
+        combo.blockSignals(True)
+
+        # the cached item tuples are reused, so the items have only changed if the tuple is different
+        if not self.combo_items.get(combo) is items:
+            combo.clear()
+            combo.addItems(items)
+            self.combo_items[combo] = items
 
-        for day in range(1, max_day + 1):
-            self.day_combo.addItem(str(day))
-        self.day_combo.setCurrentIndex(self.selected_date.day - 1)
-        self.day_combo.currentIndexChanged.connect(self.day_changed)
+        if combo.currentIndex() != index:
+            combo.setCurrentIndex(index)
 
-    
+        combo.blockSignals(False)
+
+    # changing the day doesn't change the items of any combo box
     def day_changed(self, index):
-        print(f"new day: {index + 1}")
         self.selected_date = datetime(self.selected_date.year, self.selected_date.month, index + 1)
-        self.redraw_combos()
 
     def month_changed(self, index):
         clamped_day = self.get_clamped_day(self.selected_date.year, index + 1)
@@ -274,16 +316,17 @@ class DatePicker(QtWidgets.QHBoxLayout):
         self.redraw_combos()
 
     def year_changed(self, index):
-        clamped_day = self.get_clamped_day(int(self.year_combo.currentText()), self.selected_date.month)
-        self.selected_date = datetime(int(self.year_combo.currentText()), self.selected_date.month, clamped_day)
+        year = self.first_year + index
+        clamped_day = self.get_clamped_day(year, self.selected_date.month)
+        self.selected_date = datetime(year, self.selected_date.month, clamped_day)
         self.redraw_combos()
     
     def get_clamped_day(self, year, month) -> int:
-        (_, max_day) = calendar.monthrange(year, month)
+        max_day = days_in_month(year, month)
 
         # ? range check: ensure the day field is within the range of the days of the month
         clamped_day = self.selected_date.day
         if self.selected_date.day > max_day:
             clamped_day = max_day
         
-        return clamped_day
\ No newline at end of file
+        return clamped_day
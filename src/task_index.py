@@ -0,0 +1,245 @@
+import re
+from bisect import bisect_left, insort
+from datetime import datetime
+from itertools import count
+from operator import attrgetter
+
+from task import *
+
+# ? Data types:
+# ?     - SearchIndex: finds the tasks whose title or class contains words starting with the words typed into the search box
+# ?     - str: a token is a single lowercase word from a task's title or class
+# ?     - DueDateIndex: finds the tasks due between two dates without checking every task
+# ?     - BucketIndex: groups tasks by the value of one field, used to find every task in a class or with a priority
+# ?     - FilterIndex: combines the due date, class and priority indexes so they can be updated together
+# ? Data structures:
+# ?     - dict[str, set[Task]]: inverted index, maps each token to the tasks that contain it. Tasks are hashed by identity
+# ?     - dict[Task, set[str]]: the tokens each task was indexed with, used to update the index when a task changes
+# ?     - list[str]: every token in sorted order, tokens starting with a prefix are next to each other so they can be found with a binary search
+# ?     - list[tuple[datetime, int]]: due dates in sorted order, the int breaks ties between tasks due at the same time
+# ?     - dict[object, set[Task]]: maps each value of a field (e.g. each class) to the tasks with that value
+
+# matches a single word
+WORD_PATTERN = re.compile(r"\w+")
+
+# splits text into lowercase words
+def tokenize(text: str) -> list[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+# the tokens a task is indexed with
+def task_tokens(task: Task) -> set[str]:
+    return set(tokenize(task.title)) | set(tokenize(task.class_name))
+
+# inverted index of the words in each task's title and class
+# ! the index is updated one task at a time as tasks change, so it never needs to be rebuilt while searching
+class SearchIndex:
+    def __init__(self, tasks=()):
+        self.postings: dict[str, set[Task]] = {}
+        self.task_tokens: dict[Task, set[str]] = {}
+        self.sorted_tokens: list[str] = []
+
+        # ! when building the index the tokens are sorted once at the end, instead of inserting each new token into the sorted list
+        for task in tasks:
+            tokens = task_tokens(task)
+            self.task_tokens[task] = tokens
+
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(task)
+
+        self.sorted_tokens = sorted(self.postings)
+
+    def add(self, task: Task):
+        tokens = task_tokens(task)
+        self.task_tokens[task] = tokens
+
+        for token in tokens:
+            self.add_posting(token, task)
+
+    def remove(self, task: Task):
+        tokens = self.task_tokens.pop(task, set())
+
+        for token in tokens:
+            self.remove_posting(token, task)
+
+    # re-indexes a task after its title or class has changed
+    # only the tokens that were added or removed are changed
+    def update(self, task: Task):
+        # ? existence check: tasks that weren't indexed are added
+        if not task in self.task_tokens:
+            self.add(task)
+            return
+
+        old_tokens = self.task_tokens[task]
+        new_tokens = task_tokens(task)
+
+        for token in old_tokens - new_tokens:
+            self.remove_posting(token, task)
+        for token in new_tokens - old_tokens:
+            self.add_posting(token, task)
+
+        self.task_tokens[task] = new_tokens
+
+    def add_posting(self, token: str, task: Task):
+        tasks = self.postings.get(token)
+
+        if tasks is None:
+            self.postings[token] = {task}
+            insort(self.sorted_tokens, token)
+        else:
+            tasks.add(task)
+
+    def remove_posting(self, token: str, task: Task):
+        tasks = self.postings[token]
+        tasks.discard(task)
+
+        # remove tokens that are no longer used by any task
+        if len(tasks) == 0:
+            del self.postings[token]
+            del self.sorted_tokens[bisect_left(self.sorted_tokens, token)]
+
+    # returns the tasks that contain a token starting with a prefix
+    def prefix_matches(self, prefix: str) -> set[Task]:
+        start = bisect_left(self.sorted_tokens, prefix)
+        # every token starting with the prefix sorts before the prefix followed by the largest character
+        end = bisect_left(self.sorted_tokens, prefix + chr(0x10FFFF), start)
+
+        if end - start == 1:
+            return self.postings[self.sorted_tokens[start]]
+
+        return set().union(*(self.postings[token] for token in self.sorted_tokens[start:end]))
+
+    # returns the tasks matching every word in the query
+    # each word matches the start of a word in the title or class, so tasks are found while the user is still typing
+    def search(self, query: str) -> set[Task]:
+        result = None
+
+        for word in set(tokenize(query)):
+            matches = self.prefix_matches(word)
+            result = set(matches) if result is None else result & matches
+
+            # stop early as no tasks can match
+            if len(result) == 0:
+                break
+
+        return set() if result is None else result
+
+    # checks if a single task matches every word in the query, without searching the whole index
+    def matches(self, task: Task, query: str) -> bool:
+        tokens = self.task_tokens.get(task)
+        if tokens is None:
+            tokens = task_tokens(task)
+
+        return all(any(token.startswith(word) for token in tokens) for word in tokenize(query))
+
+# keeps tasks sorted by due date, so the tasks due in a date range can be found with a binary search
+class DueDateIndex:
+    def __init__(self, tasks=()):
+        # ! tasks due at the same time are ordered by when they were added, so every key is unique
+        self.counter = count()
+        self.task_keys: dict[Task, tuple[datetime, int]] = {}
+
+        for task in tasks:
+            self.task_keys[task] = (task.due_date, next(self.counter))
+
+        # the keys and tasks are stored in two lists in the same order
+        order = sorted(self.task_keys.items(), key=lambda item: item[1])
+        self.keys: list[tuple[datetime, int]] = [key for _, key in order]
+        self.tasks: list[Task] = [task for task, _ in order]
+
+    def add(self, task: Task):
+        key = (task.due_date, next(self.counter))
+        position = bisect_left(self.keys, key)
+
+        self.keys.insert(position, key)
+        self.tasks.insert(position, task)
+        self.task_keys[task] = key
+
+    def remove(self, task: Task):
+        key = self.task_keys.pop(task, None)
+
+        # ? existence check: the task isn't in the index
+        if key is None:
+            return
+
+        position = bisect_left(self.keys, key)
+        del self.keys[position]
+        del self.tasks[position]
+
+    # moves a task after its due date has changed
+    def update(self, task: Task):
+        key = self.task_keys.get(task)
+
+        if key is None or key[0] != task.due_date:
+            self.remove(task)
+            self.add(task)
+
+    # returns the tasks due from start up to (but not including) end, in due date order
+    def between(self, start: datetime, end: datetime) -> list[Task]:
+        # a tuple containing only the date sorts before every key with the same date
+        return self.tasks[bisect_left(self.keys, (start,)):bisect_left(self.keys, (end,))]
+
+# groups tasks by the value of one of their fields
+class BucketIndex:
+    def __init__(self, field: str, tasks=()):
+        self.get_key = attrgetter(field)
+        self.buckets: dict[object, set[Task]] = {}
+        self.task_keys: dict[Task, object] = {}
+
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task: Task):
+        key = self.get_key(task)
+
+        self.task_keys[task] = key
+        self.buckets.setdefault(key, set()).add(task)
+
+    def remove(self, task: Task):
+        # ? existence check: the task isn't in the index
+        if not task in self.task_keys:
+            return
+
+        key = self.task_keys.pop(task)
+        bucket = self.buckets[key]
+        bucket.discard(task)
+
+        # remove values that are no longer used by any task
+        if len(bucket) == 0:
+            del self.buckets[key]
+
+    # moves a task to another bucket after its field has changed
+    def update(self, task: Task):
+        if not task in self.task_keys or self.task_keys[task] != self.get_key(task):
+            self.remove(task)
+            self.add(task)
+
+    # returns the tasks with a value
+    # ! the returned set is used by the index, it must not be changed
+    def get(self, key) -> set[Task]:
+        return self.buckets.get(key, set())
+
+    # returns every value used by at least one task, in sorted order
+    def keys(self) -> list:
+        return sorted(self.buckets)
+
+# the indexes used to filter the task list by due date, class or priority
+class FilterIndex:
+    def __init__(self, tasks=()):
+        self.due_dates = DueDateIndex(tasks)
+        self.classes = BucketIndex("class_name", tasks)
+        self.priorities = BucketIndex("priority", tasks)
+
+    def add(self, task: Task):
+        self.due_dates.add(task)
+        self.classes.add(task)
+        self.priorities.add(task)
+
+    def remove(self, task: Task):
+        self.due_dates.remove(task)
+        self.classes.remove(task)
+        self.priorities.remove(task)
+
+    def update(self, task: Task):
+        self.due_dates.update(task)
+        self.classes.update(task)
+        self.priorities.update(task)
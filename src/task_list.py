@@ -1,164 +1,515 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
 from PySide6 import QtWidgets
 from PySide6 import QtCore
 from PySide6 import QtGui
 
 from task import *
+from task_sort import *
+from task_store import TaskStore
+from lazy_tasks import LazyTaskList
+from task_index import *
+from history import find_task
 from utils import *
+from tracing import traced
 
 # ? Data types:
 # ?     - Enum: was used for self.sort_type because it can easily represent a finite number of states (such as sorting by name, class, etc)
-# ?     - int: used to keep track of the current index when iterating over a list of task cards. This was necessary to check if it should be striped or not (based on if its index was odd or even)
+# ?     - int: used to keep track of the row of the selected task. Rows are also used to check if a task should be striped or not (based on if its index was odd or even)
 # ?     - str: used to store text that will be displayed to the user in the GUI
 # ?     - bool: used because it can only represent a binary on/off state, was used to convey if a task should be striped or not and if task matched a sort comparison
-# ?     - TaskCard: represents a single task in the GUI, stores the child GUI widgets used to create the task card in the ui
-# ?     - TaskList: represents the scrollable list part of the task list GUI. Acts as a container for the widgets that handle scrolling and the TaskCards
-# ?     - TaskView: represents the entire task list GUI, combines the TaskList with a header and handles task sorting
+# ?     - TaskListModel: exposes the list of Task objects to Qt's model/view classes, one row per task
+# ?     - TaskDelegate: paints a single task card in the list. Only rows that are visible in the scroll area are painted
+# ?     - TaskList: represents the scrollable list part of the task list GUI. Handles selection and marking tasks as complete
+# ?     - TaskView: represents the entire task list GUI, combines the TaskList with a header and handles task sorting and searching
+# ?     - SearchIndex: finds the tasks matching the search box without checking every task (see task_index.py)
+# ?     - FilterIndex: finds the tasks matching the filter box by due date, class or priority without checking every task
+# ?     - tuple: a filter is stored as a tuple of the filter type and its value (e.g. ("class", "Maths")), or None to show every task
 # ? Data Structures:
 # ?     - list[Task]: was used because it provides a method of storing Tasks in a way that allows more tasks to be added and sorted
+# ?     - list[int]: the indexes of the tasks shown when the list is filtered, kept in order so a task's row can be found with a binary search
+# ?     - set[Task]: the tasks changed in a batch of changes, the cards on screen are repainted if their task is in the set
+# ?       the selected tasks are also a set, so they stay selected when their rows move and selecting many tasks is O(1) per task
+
+# custom data role used to get the Task object for a row from the model
+TASK_ROLE = QtCore.Qt.ItemDataRole.UserRole
+
+# the number of changed tasks above which the filtered task list is rebuilt instead of showing or hiding each task
+REFILTER_LIMIT = 64
 
-# an enum has been used as the sort type can only be defined as these specific values
-# (effectively a constant)
-class SortType(IntEnum):
-    NAME = 0
-    CLASS = 1
-    DUEDATE = 2
-    PRIORITY = 3
-
-    # override string casting for the button text
-    def __str__(self):
-        match self:
-            case SortType.NAME:
-                return "Name"
-            case SortType.CLASS:
-                return "Class"
-            case SortType.DUEDATE:
-                return "Due Date"
-            case SortType.PRIORITY:
-                return "Priority"
-            case _:
-                return f"Unknown ({self.value})"
-
-# represents a single task entry in the task list
-class TaskCard(QtWidgets.QFrame):
-    selected = QtCore.Signal(Task)
-
-    def __init__(self, task: Task, striped: bool, index: int):
+# exposes the list of tasks to the task list view
+# ! no widgets are created per task, the view asks the model for the rows it needs to paint
+# when the list is filtered only some of the tasks are shown, rows are the row in the view and indexes are the index in the list of tasks
+class TaskListModel(QtCore.QAbstractListModel):
+    def __init__(self, tasks: list[Task]):
         super().__init__()
 
-        self.index = index
-        self.task = task
+        self.tasks = tasks
+        # the index of the task shown in each row, in the same order as the tasks. None if every task is shown
+        self.rows: list[int] | None = None
 
-        hbox = QtWidgets.QHBoxLayout()
-        vbox = QtWidgets.QVBoxLayout()
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        # list models have no children
+        if parent.isValid():
+            return 0
 
-        # initialise labels
-        # use html/rich text for text formatting
-        title = QtWidgets.QLabel(f"<h3>{task.get_title()}</h3>")
-        due_date = QtWidgets.QLabel(f"<p><i><u><b>{task.get_due_date().strftime("%d/%m/%y")}</b></u></i></p>")
-        class_name = QtWidgets.QLabel(f"{task.get_class()}") 
+        return len(self.tasks) if self.rows is None else len(self.rows)
 
-        vbox.addWidget(title)
-        vbox.addWidget(due_date)
-        vbox.addWidget(class_name)
+    # returns the index of the task shown in a row
+    def task_index(self, row: int) -> int:
+        return row if self.rows is None else self.rows[row]
 
-        hbox.addLayout(vbox)
+    # returns the row a task is shown in, None if the task is hidden
+    # ! the rows are in the same order as the tasks, so this is a binary search
+    def task_row(self, index: int) -> int | None:
+        if self.rows is None:
+            return index
 
-        hbox.addStretch()
+        row = bisect_left(self.rows, index)
+        if row < len(self.rows) and self.rows[row] == index:
+            return row
 
-        # allows the task to be marked as complete from the task list
-        self.checkbox = QtWidgets.QCheckBox()
-        self.checkbox.setChecked(task.is_complete())
-        self.checkbox.checkStateChanged.connect(self.checkbox_pressed)
-        hbox.addWidget(self.checkbox)
+        return None
 
-        colour = "light" if striped else "window"
+    # returns the task shown in a row
+    def task_at(self, row: int) -> Task:
+        return self.tasks[self.task_index(row)]
 
-        # set style and sizing
-        super().setLayout(hbox)
-        super().setStyleSheet(f"background-color: palette({colour}); border-radius: 8px;")
-        # allows the card to fill horizontal space but not vertical space
-        super().setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Fixed)
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole):
+        # ? range check
+        if not index.isValid() or index.row() >= self.rowCount():
+            return None
 
-    # mark as complete callback
-    def checkbox_pressed(self):
-        self.task.set_completed(self.checkbox.isChecked())
+        task = self.task_at(index.row())
 
-    # mouse click callback
-    # used to determine if this task card has been selected
-    def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
-        # signal to the rest of the program that this task has been selected
-        self.selected.emit(self.index)
+        match role:
+            case QtCore.Qt.ItemDataRole.DisplayRole:
+                return task.get_title()
+            case QtCore.Qt.ItemDataRole.CheckStateRole:
+                return QtCore.Qt.CheckState.Checked if task.is_complete() else QtCore.Qt.CheckState.Unchecked
+            # TASK_ROLE
+            case QtCore.Qt.ItemDataRole.UserRole:
+                return task
 
-# represents the scrollable list part of the widget
-class TaskList(QtWidgets.QScrollArea):
-    def __init__(self, tasks: list[Task], on_task_selected):
-        super().__init__()
-        # set styling and sizing
-        super().setFrameShape(QtWidgets.QFrame.Shape.NoFrame)
-        super().setWidgetResizable(True)
+        return None
 
-        self.main_vbox = QtWidgets.QVBoxLayout()
-        
-        # a blank widget is used to hold the vbox which contains the task cards
-        # this widget is set as the primary widget for the qscrollarea
-        self.holder_widget = QtWidgets.QWidget()
-        self.holder_widget.setSizePolicy(QtWidgets.QSizePolicy.Policy.Expanding, QtWidgets.QSizePolicy.Policy.Preferred)
-
-        # set vbox styling
-        self.list_vbox = QtWidgets.QVBoxLayout()
-        self.list_vbox.setSpacing(0)
-        self.list_vbox.setContentsMargins(0, 0, 0, 0)
-
-        # this pushes all task cards to the top of the task list
-        self.list_spacer = QtWidgets.QSpacerItem(
-            0, 0,
-            QtWidgets.QSizePolicy.Policy.Minimum,
-            QtWidgets.QSizePolicy.Policy.Expanding
+    # used by the completion checkbox to mark a task as complete
+    def setData(self, index: QtCore.QModelIndex, value, role: int = QtCore.Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or role != QtCore.Qt.ItemDataRole.CheckStateRole:
+            return False
+
+        self.task_at(index.row()).set_completed(QtCore.Qt.CheckState(value) == QtCore.Qt.CheckState.Checked)
+        self.dataChanged.emit(index, index, [role])
+
+        return True
+
+    def flags(self, index: QtCore.QModelIndex) -> QtCore.Qt.ItemFlag:
+        return QtCore.Qt.ItemFlag.ItemIsEnabled | QtCore.Qt.ItemFlag.ItemIsUserCheckable | QtCore.Qt.ItemFlag.ItemNeverHasChildren
+
+    # replaces the list of tasks shown by the model
+    # rows is the indexes of the tasks to show, or None to show every task
+    def set_tasks(self, tasks: list[Task], rows: list[int] | None = None):
+        self.beginResetModel()
+        self.tasks = tasks
+        self.rows = rows
+        self.endResetModel()
+
+    # the functions below change a single task in the task list
+    # ! the view only updates the affected row instead of rebuilding every row
+    # they take the index of the task, insert_task and remove_task return the row that changed or None if the task is hidden
+
+    # inserts a task into the list of tasks at an index
+    # when the list is filtered the task is only shown if visible is True
+    def insert_task(self, index: int, task: Task, visible: bool = True) -> int | None:
+        # task databases aren't filtered, but they put the task where it belongs in their sort order rather than at the index
+        # ! the row is only known once the task has been inserted, so the view is reset
+        if isinstance(self.tasks, TaskStore):
+            self.beginResetModel()
+            row = self.tasks.insert(index, task)
+            self.endResetModel()
+            return row
+
+        if self.rows is None:
+            self.beginInsertRows(QtCore.QModelIndex(), index, index)
+            self.tasks.insert(index, task)
+            self.endInsertRows()
+            return index
+
+        # the tasks after the new task move down by one
+        row = bisect_left(self.rows, index)
+        self.rows[row:] = [task_index + 1 for task_index in self.rows[row:]]
+
+        if not visible:
+            self.tasks.insert(index, task)
+            return None
+
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.tasks.insert(index, task)
+        self.rows.insert(row, index)
+        self.endInsertRows()
+        return row
+
+    # removes the task at an index from the list of tasks
+    def remove_task(self, index: int) -> int | None:
+        row = self.task_row(index)
+
+        if row is None:
+            del self.tasks[index]
+        else:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self.tasks[index]
+            if not self.rows is None:
+                del self.rows[row]
+            self.endRemoveRows()
+
+        # the tasks after the removed task move up by one
+        if not self.rows is None:
+            after = bisect_left(self.rows, index)
+            self.rows[after:] = [task_index - 1 for task_index in self.rows[after:]]
+
+        return row
+
+    # removes the tasks at several indexes, which are in order, from the list of tasks
+    # ! the view is updated once, rather than once for each task
+    def remove_tasks(self, indexes: list[int]):
+        self.beginResetModel()
+
+        # task databases remove every task in one transaction
+        if isinstance(self.tasks, TaskStore):
+            self.tasks.remove_many(indexes)
+        else:
+            # tasks are removed from the end of the list, so the indexes of the tasks that are still to be removed don't change
+            for index in reversed(indexes):
+                del self.tasks[index]
+
+        # each task that is still shown moves up by the number of removed tasks before it
+        if not self.rows is None:
+            removed = set(indexes)
+            self.rows = [index - bisect_left(indexes, index) for index in self.rows if not index in removed]
+
+        self.endResetModel()
+
+    # shows or hides a task when the list is filtered, e.g. after it has been edited to no longer match the search
+    # returns the row that was shown or hidden, or None if nothing changed
+    def set_task_visible(self, index: int, visible: bool) -> int | None:
+        # ? existence check: every task is shown when the list isn't filtered
+        if self.rows is None:
+            return None
+
+        row = bisect_left(self.rows, index)
+        shown = row < len(self.rows) and self.rows[row] == index
+
+        if visible and not shown:
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self.rows.insert(row, index)
+            self.endInsertRows()
+            return row
+        elif shown and not visible:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self.rows[row]
+            self.endRemoveRows()
+            return row
+
+        return None
+
+
+# paints a single task card in the task list
+# draws the same title, due date, class and checkbox that were previously separate widgets
+class TaskDelegate(QtWidgets.QStyledItemDelegate):
+    # corner radius of the card background
+    RADIUS = 8
+    # colour of the due date of overdue tasks
+    OVERDUE_COLOUR = QtGui.QColor(QtCore.Qt.GlobalColor.red)
+
+    def __init__(self, task_list: "TaskList"):
+        super().__init__(task_list)
+
+        self.task_list = task_list
+
+        # ! brushes for each card colour are cached so painting a card doesn't look up the palette
+        self.update_palette(task_list.palette())
+
+    # caches the brushes used for the selected, striped and plain card colours
+    # called again by the TaskList when the palette changes (e.g. switching to dark mode)
+    def update_palette(self, palette: QtGui.QPalette):
+        self.selected_brush = palette.brush(QtGui.QPalette.ColorRole.Accent)
+        self.striped_brush = palette.brush(QtGui.QPalette.ColorRole.Light)
+        self.plain_brush = palette.brush(QtGui.QPalette.ColorRole.Window)
+
+    # fonts used for the title and due date, based on the fonts used by the <h3> and <i><u><b> labels
+    def title_font(self, base_font: QtGui.QFont) -> QtGui.QFont:
+        font = QtGui.QFont(base_font)
+        font.setBold(True)
+        font.setPointSizeF(font.pointSizeF() * 1.2)
+        return font
+
+    def date_font(self, base_font: QtGui.QFont) -> QtGui.QFont:
+        font = QtGui.QFont(base_font)
+        font.setBold(True)
+        font.setItalic(True)
+        font.setUnderline(True)
+        return font
+
+    def margin(self) -> int:
+        return self.task_list.style().pixelMetric(QtWidgets.QStyle.PixelMetric.PM_LayoutLeftMargin)
+
+    def spacing(self) -> int:
+        return self.task_list.style().pixelMetric(QtWidgets.QStyle.PixelMetric.PM_LayoutVerticalSpacing)
+
+    # every card is the same height, which lets the view calculate row positions without asking each row
+    def row_height(self, base_font: QtGui.QFont) -> int:
+        title_height = QtGui.QFontMetrics(self.title_font(base_font)).height()
+        line_height = QtGui.QFontMetrics(base_font).height()
+
+        return self.margin() * 2 + title_height + line_height * 2 + self.spacing() * 2
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+        return QtCore.QSize(0, self.row_height(option.font))
+
+    # the area of the card that toggles the completion checkbox
+    def checkbox_rect(self, rect: QtCore.QRect) -> QtCore.QRect:
+        style = self.task_list.style()
+        width = style.pixelMetric(QtWidgets.QStyle.PixelMetric.PM_IndicatorWidth)
+        height = style.pixelMetric(QtWidgets.QStyle.PixelMetric.PM_IndicatorHeight)
+
+        return QtCore.QRect(
+            rect.right() - self.margin() - width,
+            rect.center().y() - height // 2,
+            width,
+            height
         )
 
-        self.task_cards: list[TaskCard] = []
+    def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
+        task: Task = index.data(TASK_ROLE)
+        row = index.row()
+
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+
+        # sets the cards colour based on if it's selected or if it's index is even
+        if task in self.task_list.selected_tasks:
+            brush = self.selected_brush
+        elif row % 2 == 0:
+            brush = self.striped_brush
+        else:
+            brush = self.plain_brush
+
+        painter.setPen(QtCore.Qt.PenStyle.NoPen)
+        painter.setBrush(brush)
+        painter.drawRoundedRect(option.rect, self.RADIUS, self.RADIUS)
+
+        # draw the title, due date and class name stacked vertically
+        margin = self.margin()
+        checkbox_rect = self.checkbox_rect(option.rect)
+        text_rect = option.rect.adjusted(margin, margin, -(option.rect.right() - checkbox_rect.left() + margin), -margin)
+
+        text_colour = option.palette.color(QtGui.QPalette.ColorRole.WindowText)
+        # the due date of overdue tasks is drawn in red
+        # ! overdue tasks are tracked by the OverdueScheduler, so painting doesn't need to check the time
+        date_colour = self.OVERDUE_COLOUR if task in self.task_list.overdue_tasks else text_colour
+        lines = [
+            (self.title_font(option.font), text_colour, task.get_title()),
+            (self.date_font(option.font), date_colour, task.get_due_date().strftime("%d/%m/%y")),
+            (option.font, text_colour, task.get_class()),
+        ]
+
+        for font, colour, text in lines:
+            painter.setPen(colour)
+            painter.setFont(font)
+            metrics = QtGui.QFontMetrics(font)
+            line_rect = QtCore.QRect(text_rect.left(), text_rect.top(), text_rect.width(), metrics.height())
+            painter.drawText(line_rect, QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter, metrics.elidedText(text, QtCore.Qt.TextElideMode.ElideRight, text_rect.width()))
+            text_rect.setTop(text_rect.top() + metrics.height() + self.spacing())
+
+        # draw the completion checkbox
+        checkbox_option = QtWidgets.QStyleOptionButton()
+        checkbox_option.rect = checkbox_rect
+        checkbox_option.palette = option.palette
+        checkbox_option.state = QtWidgets.QStyle.StateFlag.State_Enabled
+        checkbox_option.state |= QtWidgets.QStyle.StateFlag.State_On if task.is_complete() else QtWidgets.QStyle.StateFlag.State_Off
+        self.task_list.style().drawPrimitive(QtWidgets.QStyle.PrimitiveElement.PE_IndicatorCheckBox, checkbox_option, painter, self.task_list)
+
+        painter.restore()
 
-        # populates the list with task cards based on the list of Task objects
-        self.populate_list(tasks, on_task_selected)
+# represents the scrollable list part of the widget
+# ! a single column QTableView is used instead of a QListView because QListView re-lays out every row
+# ! whenever a row is inserted, removed or changed. Table rows have a fixed height so these are O(1)
+# tasks are sent to the rest of the program by their id, as their index changes when the list is sorted or filtered
+# several tasks can be selected with shift and ctrl (cmd on macOS) clicks, so they can be changed together (see HomeworkOrganiser)
+class TaskList(QtWidgets.QTableView):
+    selected = QtCore.Signal(int)
+    # emitted with the number of selected tasks whenever the selection changes
+    selection_changed = QtCore.Signal(int)
 
-        self.holder_widget.setLayout(self.list_vbox)
-        super().setWidget(self.holder_widget)
-    
-    # remove all tasks cards from the widget
+    def __init__(self, tasks: list[Task], on_task_selected):
+        super().__init__()
+        # set styling and sizing
+        super().setFrameShape(QtWidgets.QFrame.Shape.NoFrame)
+        super().setShowGrid(False)
+        super().setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+        super().setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        super().setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        # selection is drawn by the TaskDelegate rather than Qt's selection model
+        super().setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.NoSelection)
+        self.viewport().setBackgroundRole(QtGui.QPalette.ColorRole.Window)
+
+        # the selected tasks, the first task is selected by a plain click and more are added with shift or ctrl clicks
+        self.selected_tasks: set[Task] = set()
+        # the row of the last task that was clicked without shift, shift clicks select every row between it and the clicked row
+        self.anchor_row: int | None = None
+        # the index of the last task that was clicked, used to find it again without searching the task list (see TaskView.index_of)
+        self.clicked_index: int | None = None
+        # tasks that are overdue, set by the HomeworkOrganiser
+        self.overdue_tasks: set[Task] = set()
+
+        self.task_model = TaskListModel(tasks)
+        self.task_delegate = TaskDelegate(self)
+        super().setModel(self.task_model)
+        super().setItemDelegate(self.task_delegate)
+
+        # the single column fills the width of the list and the headers are hidden
+        self.horizontalHeader().hide()
+        self.horizontalHeader().setStretchLastSection(True)
+        self.verticalHeader().hide()
+
+        # ! all cards have the same height, so the view doesn't need to measure every row
+        self.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.task_delegate.row_height(self.font()))
+
+        self.selected.connect(on_task_selected)
+
+    # remove all tasks from the list
     def clear_list(self):
-        for card in self.task_cards:
-            card.deleteLater()
+        self.select_task(None)
+        self.task_model.set_tasks([])
 
-        self.list_vbox.removeItem(self.list_spacer)
-        self.task_cards.clear()
-    
-    # adds task cards to the list based on a list of task objects
-    # assumes task_cards is empty, otherwise duplicates will be created
-    def populate_list(self, tasks: list[Task], on_task_selected):
-        for i, task in enumerate(tasks):
-            # sets the task cards colour based on if it's index is even
-            task_card = TaskCard(task, i % 2 == 0, i)
-            task_card.selected.connect(self.select_task)
-            task_card.selected.connect(on_task_selected)
-
-            self.list_vbox.addWidget(task_card)
-            self.task_cards.append(task_card)
-        
-        self.list_vbox.addSpacerItem(self.list_spacer)
-
-    # sets the colours of all tasks cards to be striped based on their index
-    # sets the selected tasks colour to the highlighted colour
-    def select_task(self, index: int):
-        print("task selected")
-        # uses teh tasks index (int) to check if it should be coloured light or not
-        for i, task in enumerate(self.task_cards):
-            if i == index:
-                task.setStyleSheet(f"background-color: palette(accent); border-radius: 8px;")
-            else:
-                colour = "light" if i % 2 == 0 else "window"
-                task.setStyleSheet(f"background-color: palette({colour}); border-radius: 8px;")
-
-# this class combines the TaskList with a header and manages the sorting of tasks
+    # shows a list of task objects in the list
+    # replaces any tasks that were previously shown
+    # rows is the indexes of the tasks to show when the list is filtered
+    @traced
+    def populate_list(self, tasks: list[Task], rows: list[int] | None = None):
+        self.select_task(None)
+        self.task_model.set_tasks(tasks, rows)
+
+    # mouse click callback
+    # used to determine if a task has been selected or marked as complete
+    @traced
+    def mousePressEvent(self, event: QtGui.QMouseEvent) -> None:
+        position = event.position().toPoint()
+        index = self.indexAt(position)
+
+        # ? existence check: ignore clicks on the empty space below the last task
+        if not index.isValid():
+            return
+
+        self.clicked_index = self.task_model.task_index(index.row())
+        task_id = index.data(TASK_ROLE).id
+
+        if self.task_delegate.checkbox_rect(self.visualRect(index)).contains(position):
+            # allows the task to be marked as complete from the task list
+            # ! the change is reported by the task itself (see task_changes.py)
+            checked = index.data(QtCore.Qt.ItemDataRole.CheckStateRole) == QtCore.Qt.CheckState.Checked
+            new_state = QtCore.Qt.CheckState.Unchecked if checked else QtCore.Qt.CheckState.Checked
+            self.task_model.setData(index, new_state, QtCore.Qt.ItemDataRole.CheckStateRole)
+        elif event.modifiers() & QtCore.Qt.KeyboardModifier.ShiftModifier and not self.anchor_row is None:
+            self.select_range(index.row())
+        elif event.modifiers() & QtCore.Qt.KeyboardModifier.ControlModifier:
+            self.toggle_task(index.row())
+        else:
+            # signal to the rest of the program that this task has been selected
+            self.select_task(index.row())
+            self.selected.emit(task_id)
+
+    # returns the selected tasks in no particular order
+    def get_selected_tasks(self) -> list[Task]:
+        return list(self.selected_tasks)
+
+    # selects only the task in a row, or no tasks if row is None
+    # the colour of each card is chosen by the TaskDelegate when it is painted
+    # ! only the cards that were selected or have become selected are repainted
+    @traced
+    def select_task(self, row: int | None):
+        self.anchor_row = row
+        self.set_selection(set() if row is None else {self.task_model.task_at(row)})
+
+    # adds the task in a row to the selection, or removes it if it is already selected
+    def toggle_task(self, row: int):
+        self.anchor_row = row
+        self.set_selection(self.selected_tasks ^ {self.task_model.task_at(row)})
+
+    # selects the tasks in every row between the anchor row and a row
+    def select_range(self, row: int):
+        first_row, last_row = sorted((self.anchor_row, row))
+        self.set_selection({self.task_model.task_at(range_row) for range_row in range(first_row, last_row + 1)})
+
+    # unselects a task, e.g. after it has been removed or hidden
+    def deselect_task(self, task: Task):
+        if task in self.selected_tasks:
+            self.set_selection(self.selected_tasks - {task})
+
+    def set_selection(self, tasks: set[Task]):
+        # ? existence check: the selection hasn't changed
+        if tasks == self.selected_tasks:
+            return
+
+        changed = tasks ^ self.selected_tasks
+        self.selected_tasks = tasks
+        self.repaint_tasks(changed)
+        self.selection_changed.emit(len(tasks))
+
+    # repaints the cards of a set of tasks after they have been changed
+    # ! only the rows on screen are checked, so this takes the same time however many tasks are in the list
+    def repaint_tasks(self, tasks: set[Task]):
+        first_row = self.rowAt(0)
+
+        # ? existence check: there are no rows to repaint
+        if first_row == -1:
+            return
+
+        # the last row doesn't reach the bottom of the list
+        last_row = self.rowAt(self.viewport().height() - 1)
+        if last_row == -1:
+            last_row = self.task_model.rowCount() - 1
+
+        for row in range(first_row, last_row + 1):
+            if self.task_model.task_at(row) in tasks:
+                self.update(self.task_model.index(row))
+
+    # updates the cached card colours when the palette changes
+    def changeEvent(self, event: QtCore.QEvent):
+        if event.type() == QtCore.QEvent.Type.PaletteChange:
+            self.task_delegate.update_palette(self.palette())
+            self.viewport().update()
+
+        super().changeEvent(event)
+
+    # keeps the anchor row pointing at the same task when a row is inserted above it
+    # ! the selection is a set of tasks, so it doesn't change when rows move
+    def row_inserted(self, row: int):
+        if not self.anchor_row is None and row <= self.anchor_row:
+            self.anchor_row += 1
+
+    # keeps the anchor row pointing at the same task when a row is removed above it
+    def row_removed(self, row: int):
+        if self.anchor_row is None:
+            return
+
+        if row == self.anchor_row:
+            self.anchor_row = None
+        elif row < self.anchor_row:
+            self.anchor_row -= 1
+
+# combo box used to choose a filter
+# the list of classes can change whenever a task is edited, so the items are refreshed right before the popup is shown
+class FilterBox(QtWidgets.QComboBox):
+    about_to_show = QtCore.Signal()
+
+    def showPopup(self):
+        self.about_to_show.emit()
+        super().showPopup()
+
+# this class combines the TaskList with a header and manages the sorting and searching of tasks
 class TaskView(QtWidgets.QVBoxLayout):
     def __init__(self, tasks: list[Task], on_task_selected):
         super().__init__()
@@ -169,12 +520,22 @@ class TaskView(QtWidgets.QVBoxLayout):
 
         self.tasks = tasks
         self.sort_type = SortType.NAME
+        self.sort_descending = False
+
+        self.search_query = ""
+        self.task_filter: tuple | None = None
+        # the indexes are built when the tasks are loaded, see set_tasks
+        self.search_index: SearchIndex | None = None
+        self.filter_index: FilterIndex | None = None
+        # the index of each task, used to find the rows of the tasks that match a search or filter
+        # ! it is found again the next time the list is filtered after tasks have moved, e.g. when the list is sorted
+        self.positions: dict[Task, int] | None = None
 
         # draw ui
         self.show_header()
         self.show_list(on_task_selected)
 
-    # shows the header part of the list, including the title and sort button
+    # shows the header part of the list, including the title, search box, filter box and sort button
     # split from __init__ for readability
     def show_header(self):
         self.header_hbox = QtWidgets.QHBoxLayout()
@@ -182,6 +543,19 @@ class TaskView(QtWidgets.QVBoxLayout):
         self.title = QtWidgets.QLabel('<h2>Tasks</h2>')
         self.header_hbox.addWidget(self.title)
 
+        self.search_box = QtWidgets.QLineEdit()
+        self.search_box.setPlaceholderText("Search")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.setMinimumWidth(self.search_box.fontMetrics().horizontalAdvance("Search") * 3)
+        self.search_box.textChanged.connect(self.search_changed)
+        self.header_hbox.addWidget(self.search_box, stretch=1)
+
+        self.filter_box = FilterBox()
+        self.add_filters(False)
+        self.filter_box.about_to_show.connect(self.add_filters)
+        self.filter_box.currentIndexChanged.connect(self.filter_changed)
+        self.header_hbox.addWidget(self.filter_box)
+
         self.sort_btn = QtWidgets.QPushButton(f"Sort by: {str(self.sort_type)}")
         self.sort_btn.clicked.connect(self.change_sort)
         self.header_hbox.addWidget(self.sort_btn)
@@ -198,11 +572,283 @@ class TaskView(QtWidgets.QVBoxLayout):
         self.task_list = TaskList(self.tasks, on_task_selected)
         super().addWidget(self.task_list)
 
+    # replaces the tasks shown in the task list, e.g. when a file is opened
+    # search_index and filter_index are the indexes of the tasks if they were built by the worker that loaded them (see menu.py), otherwise they are built here
+    # ! building the indexes when the tasks are loaded means the first search or filter doesn't have to index every task
+    # ! indexed files are only indexed when they are searched or filtered, as indexing them decodes every task (see lazy_tasks.py)
+    @traced
+    def set_tasks(self, tasks: list[Task], search_index: SearchIndex | None = None, filter_index: FilterIndex | None = None):
+        self.tasks = tasks
+        self.search_index = search_index
+        self.filter_index = filter_index
+        self.positions = None
+
+        if not isinstance(tasks, (TaskStore, LazyTaskList)):
+            if self.search_index is None:
+                self.search_index = SearchIndex(tasks)
+            if self.filter_index is None:
+                self.filter_index = FilterIndex(tasks)
+
+        # task databases aren't kept in memory, so they can't be indexed
+        # ! indexing a database would read every task into memory
+        is_store = isinstance(tasks, TaskStore)
+        self.search_box.setEnabled(not is_store)
+        self.filter_box.setEnabled(not is_store)
+        if is_store:
+            self.search_box.clear()
+            self.filter_box.setCurrentIndex(0)
+
+        self.redraw_list()
+
     # clears and repopulates the task list
-    # used when a Task object is changed
+    # used when the whole list is replaced or reordered
+    @traced
     def redraw_list(self):
-        self.task_list.clear_list()
-        self.task_list.populate_list(self.tasks, self.on_task_selected)
+        self.task_list.populate_list(self.tasks, self.filter_tasks())
+
+    # returns the indexes of the tasks that match the search box and filter, or None if every task should be shown
+    def filter_tasks(self) -> list[int] | None:
+        matches: list[set[Task]] = []
+
+        # searches without any words show every task
+        if len(tokenize(self.search_query)) > 0:
+            if self.search_index is None:
+                self.search_index = SearchIndex(self.tasks)
+            matches.append(self.search_index.search(self.search_query))
+
+        if not self.task_filter is None:
+            matches.append(self.filter_matches())
+
+        # ? existence check: nothing has been searched for or filtered
+        if len(matches) == 0:
+            return None
+
+        visible = set.intersection(*matches) if len(matches) > 1 else matches[0]
+
+        # ! only the matching tasks are looked up, instead of checking every task in the list
+        positions = self.get_positions()
+        return sorted(positions[task] for task in visible)
+
+    # returns the index of each task, finding them again if tasks have moved since they were last used
+    def get_positions(self) -> dict[Task, int]:
+        if self.positions is None:
+            self.positions = {task: index for index, task in enumerate(self.tasks)}
+
+        return self.positions
+
+    # returns the filter index, building it if it hasn't been used yet, e.g. for an indexed file
+    def get_filter_index(self) -> FilterIndex:
+        if self.filter_index is None:
+            self.filter_index = FilterIndex(self.tasks)
+
+        return self.filter_index
+
+    # returns the dates a due date filter covers, starting at the beginning of today
+    def due_date_range(self, days: int) -> tuple[datetime, datetime]:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return (today, today + timedelta(days=days))
+
+    # returns the tasks that match the current filter
+    def filter_matches(self) -> set[Task]:
+        filter_index = self.get_filter_index()
+
+        match self.task_filter:
+            case ("due", days):
+                return set(filter_index.due_dates.between(*self.due_date_range(days)))
+            case ("class", class_name):
+                return filter_index.classes.get(class_name)
+            case ("priority", priority):
+                return filter_index.priorities.get(priority)
+
+        return set(self.tasks)
+
+    # checks if a single task matches the current filter
+    def matches_filter(self, task: Task) -> bool:
+        match self.task_filter:
+            case ("due", days):
+                start, end = self.due_date_range(days)
+                return start <= task.get_due_date() < end
+            case ("class", class_name):
+                return task.get_class() == class_name
+            case ("priority", priority):
+                return task.get_priority() == priority
+
+        return True
+
+    # fills the filter box with every filter, including a filter for each class if include_classes is True
+    # the current filter stays selected
+    def add_filters(self, include_classes: bool = True):
+        filters = [("All Tasks", None), ("Due Today", ("due", 1)), ("Due in 7 Days", ("due", 7))]
+        filters += [(f"{priority.name.replace("_", " ").title()} Priority", ("priority", priority)) for priority in TaskPriority]
+
+        # the list of classes comes from the filter index, so it is only built once the filter box is opened
+        if include_classes:
+            filters += [(f"Class: {class_name}", ("class", class_name)) for class_name in self.get_filter_index().classes.keys()]
+
+        # changing the items would otherwise change the filter
+        self.filter_box.blockSignals(True)
+        self.filter_box.clear()
+        for text, task_filter in filters:
+            self.filter_box.addItem(text, task_filter)
+
+        # keep showing a class filter even if no tasks are left in that class
+        current = next((i for i, (_, task_filter) in enumerate(filters) if task_filter == self.task_filter), None)
+        if current is None:
+            self.filter_box.addItem(f"Class: {self.task_filter[1]}", self.task_filter)
+            current = self.filter_box.count() - 1
+
+        self.filter_box.setCurrentIndex(current)
+        self.filter_box.blockSignals(False)
+
+    # callback for the filter box
+    @traced
+    def filter_changed(self, index: int):
+        self.task_filter = self.filter_box.itemData(index)
+        self.redraw_list()
+
+    # callback for the search box
+    # filters the task list as the user types
+    @traced
+    def search_changed(self, text: str):
+        self.search_query = text
+        self.redraw_list()
+
+    # checks if a task should be shown in the task list
+    def is_visible(self, task: Task) -> bool:
+        if not self.search_index is None and not self.search_index.matches(task, self.search_query):
+            return False
+
+        return self.matches_filter(task)
+
+    # returns the index of a task in the task list, or None if it isn't in the list
+    # the task that was last clicked is checked first, as it is usually the task being edited, so most lookups don't search the list
+    def index_of(self, task: Task) -> int | None:
+        return find_task(self.tasks, task, self.task_list.clicked_index)
+
+    # returns the indexes of a set of tasks in the task list in order, leaving out tasks that aren't in the list
+    # ! the list is searched once rather than once for each task, and the search stops once every task has been found
+    def indexes_of(self, tasks: set[Task]) -> list[int]:
+        # lazily loaded lists only check the tasks that have been decoded (see lazy_tasks.py)
+        searched = self.tasks.tasks if isinstance(self.tasks, LazyTaskList) else self.tasks
+        indexes = []
+
+        for index, task in enumerate(searched):
+            if task in tasks:
+                indexes.append(index)
+                if len(indexes) == len(tasks):
+                    break
+
+        return indexes
+
+    # adds a task to the end of the task list, and returns the index it was added at
+    def add_task(self, task: Task) -> int:
+        return self.insert_task(len(self.tasks), task)
+
+    # adds a task to the task list at an index, e.g. when a deleted task is put back by undo
+    # striping is based on the row, so only the new row and the rows below it are repainted
+    # returns the index the task was put at, which is decided by the sort order for task databases
+    @traced
+    def insert_task(self, index: int, task: Task) -> int:
+        if not self.search_index is None:
+            self.search_index.add(task)
+        if not self.filter_index is None:
+            self.filter_index.add(task)
+
+        row = self.task_list.task_model.insert_task(index, task, self.is_visible(task))
+        if not row is None:
+            self.task_list.row_inserted(row)
+
+        # tasks added to the end don't move any other task
+        if not self.positions is None and index == len(self.tasks) - 1:
+            self.positions[task] = index
+        else:
+            self.positions = None
+
+        # task databases are never filtered, so the row is the task's index
+        if isinstance(self.tasks, TaskStore):
+            return row
+        return index
+
+    # updates the task list after a batch of tasks has been changed (see task_changes.py)
+    # tasks that no longer match the search box or filter are hidden, then the changed cards that are on screen are repainted
+    @traced
+    def refresh_tasks(self, tasks: set[Task]):
+        for task in tasks:
+            if not self.search_index is None:
+                self.search_index.update(task)
+            if not self.filter_index is None:
+                self.filter_index.update(task)
+
+        # the changed tasks may have moved in a sorted task database, so the list is reset
+        # the selection is a set of tasks, so the same tasks stay selected
+        if isinstance(self.tasks, TaskStore) and self.tasks.is_sorted():
+            selected_tasks = self.task_list.selected_tasks
+            self.redraw_list()
+            self.task_list.set_selection(selected_tasks)
+            return
+
+        if not self.task_list.task_model.rows is None:
+            # ! finding each task can search the whole list, so when many tasks change the list is filtered again in one pass instead
+            # the tasks that are still shown stay selected
+            if len(tasks) > REFILTER_LIMIT:
+                selected_tasks = self.task_list.selected_tasks
+                self.redraw_list()
+                self.task_list.set_selection({task for task in selected_tasks if self.is_visible(task)})
+                return
+
+            for task in tasks:
+                index = self.index_of(task)
+                if index is None:
+                    continue
+
+                visible = self.is_visible(task)
+                row = self.task_list.task_model.set_task_visible(index, visible)
+
+                if not row is None and visible:
+                    self.task_list.row_inserted(row)
+                elif not row is None:
+                    self.task_list.row_removed(row)
+                    self.task_list.deselect_task(task)
+
+        self.task_list.repaint_tasks(tasks)
+
+    # removes a task from the task list
+    @traced
+    def remove_task(self, index: int):
+        task = self.tasks[index]
+
+        if not self.search_index is None:
+            self.search_index.remove(task)
+        if not self.filter_index is None:
+            self.filter_index.remove(task)
+
+        self.task_list.deselect_task(task)
+        row = self.task_list.task_model.remove_task(index)
+        if not row is None:
+            self.task_list.row_removed(row)
+
+        # removing the last task doesn't move any other task
+        if not self.positions is None and index == len(self.tasks):
+            del self.positions[task]
+        else:
+            self.positions = None
+
+    # removes the tasks at several indexes, which are in order, from the task list
+    # ! the list is updated once, however many tasks are removed
+    @traced
+    def remove_tasks(self, indexes: list[int]):
+        removed = {self.tasks[index] for index in indexes}
+
+        for task in removed:
+            if not self.search_index is None:
+                self.search_index.remove(task)
+            if not self.filter_index is None:
+                self.filter_index.remove(task)
+
+        self.task_list.set_selection(self.task_list.selected_tasks - removed)
+        self.task_list.anchor_row = None
+        self.task_list.task_model.remove_tasks(indexes)
+        self.positions = None
 
     # callback for the sort button
     # changes the sort type, sorts the tasks and redraws the task list
@@ -218,48 +864,13 @@ class TaskView(QtWidgets.QVBoxLayout):
         self.sort_btn.setText(f"Sort by: {str(self.sort_type)}")
     
     # sorts the list of Task objects based on sort_type
+    @traced
     def sort_tasks(self):
-        # these functions are defined within the function as they are only used in this function
-        # defines the comparison made to sort the list baed on the sort type
-        def sort_name(a: Task, b: Task) -> bool:
-            return a.title < b.title
-        def sort_class(a: Task, b: Task) -> bool:
-            return a.class_name < b.class_name
-        def sort_priority(a: Task, b: Task) -> bool:
-            return a.priority.value < b.priority.value
-        def sort_due_date(a: Task, b: Task) -> bool:
-            return a.due_date < b.due_date
-        
-        # swap two elements in a list
-        def swap(v, i, j):
-            v[i], v[j] = v[j], v[i]
-        
-        # this is effectively an anonymous function
-        # is used to compare different fields of the task based on the SortType
-        # improves performance and readability
-        sort_cmp = sort_name
-
-        # set the sort_cmp based on the sort_type
-        match self.sort_type:
-            case SortType.NAME:
-                sort_cmp = sort_name
-            case SortType.CLASS:
-                sort_cmp = sort_class
-            case SortType.PRIORITY:
-                sort_cmp = sort_priority
-            case SortType.DUEDATE:
-                sort_cmp = sort_due_date
-        
-        # selection sort
-        list_len = len(self.tasks)
-
-        for i in range(0, list_len):
-            min_j = i
-
-            for j in range(i + 1, list_len):
-                if sort_cmp(self.tasks[j], self.tasks[min_j]):
-                    min_j = j
-            
-            if min_j != i:
-                swap(self.tasks, i, min_j)
-
+        keys = get_sort_keys(self.sort_type, self.sort_descending)
+        self.positions = None
+
+        # task databases are sorted by the database as the tasks are read
+        if isinstance(self.tasks, TaskStore):
+            self.tasks.order_by(keys)
+        else:
+            sort_tasks(self.tasks, keys)
@@ -0,0 +1,55 @@
+from task import *
+
+# ? Finds tasks by their id, so the app doesn't depend on where a task is in the task list
+# ? Data types:
+# ?     - int: each task has a unique id within its task list, which is saved with the task (see journal.py)
+# ? Data structures:
+# ?     - dict[int, Task]: maps each task's id to the task
+
+# gives a new id to every task without one or with the same id as an earlier task, e.g. tasks from several files that were opened together
+# returns the next unused id
+def assign_task_ids(tasks, next_id: int = 0) -> int:
+    used = set()
+
+    # the existing ids are found first, so new ids don't clash with ids that come later in the list
+    for task in tasks:
+        if not task.id is None:
+            next_id = max(next_id, task.id + 1)
+
+    for task in tasks:
+        if task.id is None or task.id in used:
+            task.id = next_id
+            next_id += 1
+        used.add(task.id)
+
+    return next_id
+
+# maps the id of each task in the task list to the task
+# ! tasks are looked up by id in O(1), instead of by their index which changes whenever the list is sorted or a task is removed
+class TaskMap:
+    def __init__(self):
+        self.tasks: dict[int, Task] = {}
+        self.next_id = 0
+
+    # replaces the tasks in the map, e.g. when a file is opened
+    # next_id is the next unused id of tasks that haven't been added yet (see lazy_tasks.py)
+    def set_tasks(self, tasks, next_id: int = 0):
+        self.next_id = assign_task_ids(tasks, next_id)
+        self.tasks = {task.id: task for task in tasks}
+
+    # adds a task to the map, giving it a new id if it doesn't have one or its id is used by another task
+    def add(self, task: Task):
+        if task.id is None or self.tasks.get(task.id, task) is not task:
+            task.id = self.next_id
+
+        self.tasks[task.id] = task
+        self.next_id = max(self.next_id, task.id + 1)
+
+    def remove(self, task: Task):
+        # ? existence check: only remove the task if its id hasn't been given to another task
+        if self.tasks.get(task.id) is task:
+            del self.tasks[task.id]
+
+    # returns the task with an id, or None if it isn't in the task list
+    def get(self, task_id: int) -> Task | None:
+        return self.tasks.get(task_id)
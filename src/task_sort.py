@@ -0,0 +1,103 @@
+from enum import IntEnum
+from operator import attrgetter
+
+from task import *
+
+# ? Data types:
+# ?     - Enum: was used for SortType because it can easily represent a finite number of states (such as sorting by name, class, etc)
+# ?     - SortKey: represents one level of a multi-key sort, stores the field being sorted and the direction
+# ?     - Descending: wraps a value so it sorts in reverse, allowing descending keys to be combined into one tuple
+# ?     - bool: used to represent if a sort key is ascending or descending
+# ? Data Structures:
+# ?     - list[SortKey]: was used because the order of the keys determines which field is compared first
+# ?     - dict: used to look up the task field that each SortType compares
+
+# an enum has been used as the sort type can only be defined as these specific values
+# (effectively a constant)
+class SortType(IntEnum):
+    NAME = 0
+    CLASS = 1
+    DUEDATE = 2
+    PRIORITY = 3
+
+    # override string casting for the button text
+    def __str__(self):
+        match self:
+            case SortType.NAME:
+                return "Name"
+            case SortType.CLASS:
+                return "Class"
+            case SortType.DUEDATE:
+                return "Due Date"
+            case SortType.PRIORITY:
+                return "Priority"
+            case _:
+                return f"Unknown ({self.value})"
+
+# the Task field compared by each sort type
+SORT_FIELDS = {
+    SortType.NAME: "title",
+    SortType.CLASS: "class_name",
+    SortType.DUEDATE: "due_date",
+    SortType.PRIORITY: "priority",
+}
+
+# represents one level of a multi-key sort (e.g. class, then due date, then priority)
+class SortKey:
+    def __init__(self, sort_type: SortType, descending: bool = False):
+        self.sort_type = sort_type
+        self.descending = descending
+
+    def __repr__(self) -> str:
+        return f"SortKey({str(self.sort_type)}, {"descending" if self.descending else "ascending"})"
+
+# order of the secondary keys used when tasks compare equal on the selected sort type
+TIE_BREAK_ORDER = [SortType.CLASS, SortType.DUEDATE, SortType.PRIORITY, SortType.NAME]
+
+# returns the sort keys used to sort by a sort type
+# the remaining sort types are used as tie breakers so equal tasks have a consistent order
+def get_sort_keys(sort_type: SortType, descending: bool = False) -> list[SortKey]:
+    keys = [SortKey(sort_type, descending)]
+    keys += [SortKey(other_type) for other_type in TIE_BREAK_ORDER if other_type != sort_type]
+
+    return keys
+
+# sorts a list of tasks in place by one or more sort keys
+# the first key is the most significant, later keys only break ties
+def sort_tasks(tasks: list[Task], keys: list[SortKey]):
+    # group neighbouring keys that sort in the same direction so they can be compared as one tuple
+    # ! list.sort() computes each key once per task, so this is O(n log n) with no python comparison function
+    runs: list[tuple[bool, list[str]]] = []
+    for key in keys:
+        if runs and runs[-1][0] == key.descending:
+            runs[-1][1].append(SORT_FIELDS[key.sort_type])
+        else:
+            runs.append((key.descending, [SORT_FIELDS[key.sort_type]]))
+
+    # list.sort() is stable (even when reversed), so sorting by the least significant run first
+    # leaves ties from the more significant runs in the right order
+    for descending, fields in reversed(runs):
+        tasks.sort(key=attrgetter(*fields), reverse=descending)
+
+# wraps a value so it sorts in the opposite order, used for descending keys
+class Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other: "Descending") -> bool:
+        return other.value < self.value
+
+    def __eq__(self, other: "Descending") -> bool:
+        return self.value == other.value
+
+# returns a function that converts a task into a single value that sorts in the order given by the sort keys
+# slower than sort_tasks, but needed when tasks are compared one at a time (e.g. when merging sorted files with heapq.merge)
+def get_key_function(keys: list[SortKey]):
+    getters = [(attrgetter(SORT_FIELDS[key.sort_type]), key.descending) for key in keys]
+
+    def key_function(task: Task) -> tuple:
+        return tuple(Descending(getter(task)) if descending else getter(task) for getter, descending in getters)
+
+    return key_function
@@ -0,0 +1,327 @@
+import sqlite3
+import weakref
+from abc import abstractmethod
+from collections import OrderedDict
+from collections.abc import MutableSequence
+from pathlib import Path
+
+from task import *
+from task_sort import *
+from file_io import *
+
+# ? Data sources
+# ?     - task database (.db): an SQLite database that stores one row per task. Tasks are read from the database a page at a time,
+# ?       so a large number of tasks can be shown without loading all of them into memory
+# ? Data types:
+# ?     - TaskStore: an abstract list of tasks that isn't stored in memory, can be used anywhere a list[Task] is used
+# ?     - SqliteTaskStore: a TaskStore that stores tasks in an SQLite database
+# ? Data structures:
+# ?     - OrderedDict[int, list[Task]]: cache of the most recently used pages of tasks, ordered from least to most recently used
+# ?     - WeakValueDictionary[int, Task]: maps the row id of each task that is still in use to the task, each task's id is its row id
+
+# the number of tasks read from the database at once
+PAGE_SIZE = 256
+# the number of pages kept in memory
+MAX_CACHED_PAGES = 64
+
+# the columns of the tasks table, in the order they are selected
+STORE_FIELDS = ["id"] + TASK_FIELDS
+
+# the column sorted by each sort type
+SORT_COLUMNS = {
+    SortType.NAME: "title",
+    SortType.CLASS: "class_name",
+    SortType.DUEDATE: "due_date",
+    SortType.PRIORITY: "priority",
+}
+
+# a list of tasks that is stored outside of memory
+# ! tasks can be inserted at any index, but their position is decided by the store's sort order, so insert returns the index the task was put at
+# subclasses have to implement every abstract method, as well as the MutableSequence methods
+# they also have a decode_callbacks list, whose functions are called with each task when it is read from the store
+class TaskStore(MutableSequence):
+    # returns up to limit tasks, starting at offset
+    @abstractmethod
+    def page(self, offset: int, limit: int) -> list[Task]:
+        ...
+
+    # changes the order tasks are returned in
+    @abstractmethod
+    def order_by(self, keys: list[SortKey]):
+        ...
+
+    # returns True if the tasks are sorted by their fields, so changing a task can move it to another index
+    @abstractmethod
+    def is_sorted(self) -> bool:
+        ...
+
+    # writes the changes made to a task that is in the store
+    @abstractmethod
+    def update(self, task: Task):
+        ...
+
+    # writes the changes made to several tasks in a single transaction
+    @abstractmethod
+    def update_many(self, tasks: list[Task]):
+        ...
+
+    # removes the tasks at several indexes in a single transaction
+    @abstractmethod
+    def remove_many(self, indexes: list[int]):
+        ...
+
+    # returns the task with an id if it is in use, or None
+    # ! the store keeps its own map of ids to tasks, as it only keeps the tasks that are in use in memory
+    @abstractmethod
+    def find(self, task_id: int) -> Task | None:
+        ...
+
+    # makes sure all changes have been written
+    @abstractmethod
+    def commit(self):
+        ...
+
+    @abstractmethod
+    def close(self):
+        ...
+
+# stores tasks in an SQLite database
+# ! the connection can only be used on the thread that created the store
+# raises ValueError if the file isn't a task database
+# read_only opens an existing database without writing to it, e.g. when it is an input of the command line tool (see task_stream.py)
+class SqliteTaskStore(TaskStore):
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+
+        # ! sqlite can only open a database as read only from a URI
+        if read_only:
+            self.connection = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+        else:
+            self.connection = sqlite3.connect(path)
+
+        # sqlite only reads the file when it is first used, so a file that isn't a database is found here
+        try:
+            if not read_only:
+                self.create_tables()
+
+            self.count = self.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        except sqlite3.Error as error:
+            self.connection.close()
+            raise ValueError(f"not a task database: {error}") from error
+
+        self.decode_task = get_task_decoder(STORE_FIELDS)
+        self.order = "id"
+
+        self.pages: OrderedDict[int, list[Task]] = OrderedDict()
+        # ! weak references are used so tasks can be freed once they are no longer cached or used by the app
+        self.tasks_by_row: weakref.WeakValueDictionary[int, Task] = weakref.WeakValueDictionary()
+
+        # called with each task when it is read from the database, e.g. to track when it becomes overdue
+        # ! a task that is still in use isn't read again, so each callback is called once for each task while it is in use
+        self.decode_callbacks = []
+
+    # creates the tasks table and its indexes if the database doesn't have them yet
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    class_name TEXT NOT NULL,
+                    due_date TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    completed INTEGER NOT NULL
+                )
+            """)
+
+            # each index also contains the tie breaker columns, so sorting by any sort type can read the tasks in index order
+            # ! without the tie breakers the database sorts every task each time a page is read
+            for sort_type, column in SORT_COLUMNS.items():
+                columns = ", ".join(SORT_COLUMNS[key.sort_type] for key in get_sort_keys(sort_type))
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS tasks_{column} ON tasks ({columns})")
+
+    # converts a row from the database into a task
+    # the same Task object is returned for a row while it is still in use
+    def row_to_task(self, row: tuple) -> Task:
+        task = self.tasks_by_row.get(row[0])
+
+        if task is None:
+            task = self.decode_task(row)
+            self.tasks_by_row[row[0]] = task
+
+            for callback in self.decode_callbacks:
+                callback(task)
+
+        return task
+
+    def page(self, offset: int, limit: int) -> list[Task]:
+        rows = self.connection.execute(
+            f"SELECT {", ".join(STORE_FIELDS)} FROM tasks ORDER BY {self.order} LIMIT ? OFFSET ?",
+            (limit, offset)
+        )
+
+        return [self.row_to_task(row) for row in rows]
+
+    # returns a cached page, reading it from the database if it isn't cached
+    def get_page(self, page_number: int) -> list[Task]:
+        page = self.pages.get(page_number)
+
+        if page is None:
+            page = self.page(page_number * PAGE_SIZE, PAGE_SIZE)
+            self.pages[page_number] = page
+
+            # remove the least recently used page
+            if len(self.pages) > MAX_CACHED_PAGES:
+                self.pages.popitem(last=False)
+        else:
+            self.pages.move_to_end(page_number)
+
+        return page
+
+    def order_by(self, keys: list[SortKey]):
+        columns = [f"{SORT_COLUMNS[key.sort_type]} {"DESC" if key.descending else "ASC"}" for key in keys]
+        # the id is used as a final key so the order is always the same
+        self.order = ", ".join(columns + ["id"])
+        self.pages.clear()
+
+    def is_sorted(self) -> bool:
+        return self.order != "id"
+
+    def update(self, task: Task):
+        self.update_many([task])
+
+    def update_many(self, tasks: list[Task]):
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE tasks SET title = ?, class_name = ?, due_date = ?, priority = ?, completed = ? WHERE id = ?",
+                # ? existence check: only tasks read from this store can be updated
+                (encode_task(task) + [task.id] for task in tasks if self.find(task.id) is task)
+            )
+
+        # every sort column is used as a tie breaker, so when the store is sorted the changed tasks may have moved and the cached pages are out of date
+        if self.is_sorted():
+            self.pages.clear()
+
+    def remove_many(self, indexes: list[int]):
+        tasks = [self[index] for index in indexes]
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM tasks WHERE id = ?", ((task.id,) for task in tasks))
+
+        for task in tasks:
+            self.tasks_by_row.pop(task.id, None)
+
+        self.count -= len(tasks)
+        # every task after the first removed task has moved, so the cached pages are out of date
+        self.pages.clear()
+
+    def find(self, task_id: int) -> Task | None:
+        return self.tasks_by_row.get(task_id)
+
+    # adds tasks to the database in a single transaction
+    # if keep_ids is True each task's id is used as its row id, so the ids have to be unique. Otherwise each task is given a new row id
+    def extend(self, tasks, keep_ids: bool = False):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO tasks (id, title, class_name, due_date, priority, completed) VALUES (?, ?, ?, ?, ?, ?)",
+                ([task.id if keep_ids else None] + encode_task(task) for task in tasks)
+            )
+
+        self.count = self.connection.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        self.pages.clear()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    # list functions
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Task:
+        # ? range check
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("task index out of range")
+
+        return self.get_page(index // PAGE_SIZE)[index % PAGE_SIZE]
+
+    def __setitem__(self, index: int, task: Task):
+        row_id = self[index].id
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE tasks SET title = ?, class_name = ?, due_date = ?, priority = ?, completed = ? WHERE id = ?",
+                encode_task(task) + [row_id]
+            )
+
+        task.id = row_id
+        self.tasks_by_row[row_id] = task
+        self.pages.clear()
+
+    def __delitem__(self, index: int):
+        task = self[index]
+        self.tasks_by_row.pop(task.id, None)
+
+        with self.connection:
+            self.connection.execute("DELETE FROM tasks WHERE id = ?", (task.id,))
+
+        self.count -= 1
+        # every task after the deleted task has moved, so the cached pages are out of date
+        self.pages.clear()
+
+    # the index is ignored, the task's position is decided by the sort order
+    # when the store isn't sorted new tasks are added to the end
+    # returns the index the task was put at
+    # ! the task is given its row id as its id, replacing any id it had
+    def insert(self, index: int, task: Task) -> int:
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO tasks (title, class_name, due_date, priority, completed) VALUES (?, ?, ?, ?, ?)",
+                encode_task(task)
+            )
+
+        task.id = cursor.lastrowid
+        self.tasks_by_row[cursor.lastrowid] = task
+        self.count += 1
+        self.pages.clear()
+
+        return self.index_of(task.id)
+
+    # returns the index of a task in the current sort order
+    def index_of(self, task_id: int) -> int:
+        return self.connection.execute(
+            f"SELECT position FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY {self.order}) - 1 AS position FROM tasks) WHERE id = ?",
+            (task_id,)
+        ).fetchone()[0]
+
+    # reads every task one page at a time
+    def __iter__(self):
+        rows = self.connection.execute(f"SELECT {", ".join(STORE_FIELDS)} FROM tasks ORDER BY {self.order}")
+
+        while True:
+            page = rows.fetchmany(PAGE_SIZE)
+            if len(page) == 0:
+                break
+
+            for row in page:
+                yield self.row_to_task(row)
+
+# writes a list of tasks to a new task database
+# used to save tasks on a background thread, as the database has to be opened on the thread that uses it
+# keep_ids is used when saving the app's task list, whose ids are unique. Tasks from several files can have the same id
+def export_tasks(path: str, tasks, keep_ids: bool = False, progress=None, cancel_event=None):
+    store = SqliteTaskStore(path)
+
+    try:
+        # replace any tasks that were in the database
+        with store.connection:
+            store.connection.execute("DELETE FROM tasks")
+
+        store.extend(tasks, keep_ids)
+    finally:
+        store.close()
@@ -0,0 +1,208 @@
+import csv
+import hashlib
+import heapq
+import os
+import sys
+from itertools import islice
+
+from task import *
+from task_sort import *
+from file_io import *
+
+# ? Reads, sorts, merges and writes tasks one at a time, so large task files are never loaded into memory all at once
+# ? Used by task_cli.py and by the merge action in the app
+# ! only modules that don't use Qt are imported
+# ? Data sources
+# ?     - task file (.tsk), task database (.db) or standard input ("-"): the tasks to process
+# ? Data types:
+# ?     - generator: tasks are passed between each step (reading, sorting, merging, writing) as generators
+# ?     - bytes: the content hash of a task, tasks with the same title, class and due date have the same hash
+# ? Data structures:
+# ?     - list[Task]: a chunk of tasks that is sorted in memory before being written to a temporary file
+# ?     - heap: heapq.merge keeps the next task from each sorted chunk in a heap to merge the chunks in order
+
+# the number of tasks sorted in memory at once
+# ! larger inputs are sorted in chunks which are written to temporary files and then merged
+SORT_CHUNK_SIZE = 100_000
+
+# returns the format of a file from its extension
+def get_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+
+    match extension:
+        case ".db":
+            return "db"
+        case ".csv":
+            return "csv"
+        case _:
+            return "tsk"
+
+# reads the tasks from a task file or task database one at a time
+# raises OSError if the file cannot be read and ValueError if it is invalid
+def read_task_file(path: str):
+    if path == "-":
+        yield from read_tasks(sys.stdin)
+        return
+
+    match get_format(path):
+        case "db":
+            import sqlite3
+            from task_store import SqliteTaskStore
+
+            # ? existence check: sqlite creates a new database instead of failing
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"no such file: '{path}'")
+
+            # ! the database is opened as read only, so reading it doesn't add the tables and indexes the app uses
+            store = SqliteTaskStore(path, read_only=True)
+            try:
+                yield from store
+            except sqlite3.Error as error:
+                # e.g. a database whose tasks table has different columns
+                raise ValueError(f"invalid task database: {error}") from error
+            finally:
+                store.close()
+        case "csv":
+            raise ValueError("csv files can only be written")
+        case _:
+            # task files saved by the app can have changes stored in a journal next to the file
+            # ! the journal has to be replayed on top of the file, so these files are loaded into memory
+            if os.path.exists(path + ".journal"):
+                from journal import TaskJournal
+                yield from TaskJournal(path).load()
+                return
+
+            with open_task_file(path) as save_file:
+                yield from read_tasks(save_file)
+
+# writes tasks to a task file, task database or csv file as they are read
+# raises OSError if the file cannot be written
+def write_task_file(path: str, tasks):
+    if path == "-":
+        write_tasks(sys.stdout, tasks)
+        return
+
+    match get_format(path):
+        case "db":
+            from task_store import export_tasks
+            export_tasks(path, tasks)
+        case "csv":
+            with open(path, "w", newline="", encoding="utf-8") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(TASK_FIELDS)
+                writer.writerows(encode_task(task) for task in tasks)
+        case _:
+            # compressed if the path ends with a codec's extension, e.g. merged.tsk.gz
+            with open_task_file(path, "w") as save_file:
+                write_tasks(save_file, tasks)
+
+            # an old journal would otherwise be replayed on top of the new file when it is opened
+            if os.path.exists(path + ".journal"):
+                os.remove(path + ".journal")
+
+# sorts a stream of tasks
+# tasks are sorted in chunks of chunk_size, which are written to temporary files and merged, so memory use is bounded by the chunk size
+def sort_task_stream(tasks, keys: list[SortKey], chunk_size: int = SORT_CHUNK_SIZE):
+    chunk = list(islice(tasks, chunk_size))
+
+    # small inputs are sorted in memory
+    if len(chunk) < chunk_size:
+        sort_tasks(chunk, keys)
+        yield from chunk
+        return
+
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        chunk_paths = []
+
+        while len(chunk) > 0:
+            sort_tasks(chunk, keys)
+
+            chunk_path = os.path.join(directory, f"chunk{len(chunk_paths)}.tsk")
+            with open(chunk_path, "w", encoding="utf-8") as chunk_file:
+                write_tasks(chunk_file, chunk)
+            chunk_paths.append(chunk_path)
+
+            chunk = list(islice(tasks, chunk_size))
+
+        chunk_files = [open(chunk_path, encoding="utf-8") for chunk_path in chunk_paths]
+        try:
+            # ! heapq.merge only keeps one task from each chunk in memory
+            # tasks that compare equal are taken from the earlier chunk first, so the sort is stable
+            yield from heapq.merge(*(read_tasks(chunk_file) for chunk_file in chunk_files), key=get_key_function(keys))
+        finally:
+            for chunk_file in chunk_files:
+                chunk_file.close()
+
+# returns the content hash of a task, used to find the same task in different task files
+# ! only the title, class and due date are hashed, so copies of a task that were completed or given a different priority are still duplicates
+def task_hash(task: Task) -> bytes:
+    return hashlib.blake2b(encode_json([task.title, task.class_name, task.due_date.isoformat()]).encode("utf-8"), digest_size=16).digest()
+
+# removes duplicate tasks from a stream where duplicates are next to each other
+# only the previous task's hash is kept, so this uses constant memory
+def unique_tasks(tasks):
+    previous_hash = None
+
+    for task in tasks:
+        current_hash = task_hash(task)
+
+        if current_hash != previous_hash:
+            yield task
+        previous_hash = current_hash
+
+# merges the tasks from several task files into one stream in sort order, removing duplicates
+# the files aren't sorted, so they are cut into sorted chunks which are merged with a k-way merge (see sort_task_stream)
+# memory use is bounded by the chunk size rather than the number of tasks
+def merge_task_streams(tasks, sort_type: SortType = SortType.NAME, descending: bool = False, chunk_size: int = SORT_CHUNK_SIZE):
+    # sorting by the hashed fields puts duplicates next to each other
+    # priority isn't used, so the sort leaves duplicates in the order they were read and the first copy read is kept
+    keys = [SortKey(SortType.NAME, descending and sort_type == SortType.NAME), SortKey(SortType.CLASS), SortKey(SortType.DUEDATE)]
+    tasks = unique_tasks(sort_task_stream(tasks, keys, chunk_size))
+
+    # without duplicates no two tasks are equal on these keys, so the order already matches get_sort_keys(SortType.NAME)
+    if sort_type == SortType.NAME:
+        return tasks
+
+    return sort_task_stream(tasks, get_sort_keys(sort_type, descending), chunk_size)
+
+# merges several task files or task databases into a new file, removing duplicate tasks
+# returns the number of tasks read and the number written
+# raises OSError if a file cannot be read or written, ValueError if a file is invalid and Cancelled if cancel_event is set
+# progress is called with the fraction of the merge that is done
+def merge_task_files(paths: list[str], output_path: str, sort_type: SortType = SortType.NAME, descending: bool = False,
+                     chunk_size: int = SORT_CHUNK_SIZE, progress=None, cancel_event=None) -> tuple[int, int]:
+    # the number of tasks read and written
+    counts = [0, 0]
+
+    # reading the files is the first half of merging, writing the merged tasks is the second half
+    def read_inputs():
+        for file_number, path in enumerate(paths, 1):
+            for task in read_task_file(path):
+                counts[0] += 1
+                if counts[0] % PROGRESS_INTERVAL == 0:
+                    check_cancelled(cancel_event)
+                yield task
+
+            if not progress is None:
+                progress(file_number / len(paths) / 2)
+
+    def count_output(tasks):
+        for task in tasks:
+            counts[1] += 1
+            if counts[1] % PROGRESS_INTERVAL == 0:
+                check_cancelled(cancel_event)
+                if not progress is None:
+                    progress(0.5 + counts[1] / max(counts[0], 1) / 2)
+            yield task
+
+    try:
+        write_task_file(output_path, count_output(merge_task_streams(read_inputs(), sort_type, descending, chunk_size)))
+    except BaseException:
+        # don't leave a partly merged file behind
+        if output_path != "-" and os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+    return (counts[0], counts[1])
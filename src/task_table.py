@@ -0,0 +1,244 @@
+import json
+import sys
+import weakref
+from array import array
+from datetime import datetime, timedelta
+
+from task import *
+from task_sort import *
+from file_io import *
+
+# ? Data types:
+# ?     - TaskTable: stores a large number of tasks as columns instead of one object per task, used for bulk workloads
+# ?     - TaskRow: a Task that reads and writes its fields from a row of a TaskTable, so it can be used anywhere a Task is used
+# ?       the table returns the same TaskRow for a row while it is in use, so rows can be kept in sets and maps like tasks
+# ?     - int: due dates are stored as the number of seconds since 1970, which uses 8 bytes instead of a datetime object
+# ? Data structures:
+# ?     - list[str]: titles and class names are interned, so tasks with the same class share one string
+# ?     - array: due dates, priorities and completed flags are stored as arrays of numbers, which don't need an object per value
+# ?     - list[int | None]: the id of each task, None until the task is added to a task list (see task_map.py)
+# ?     - WeakValueDictionary[int, TaskRow]: the row views that are in use, so the same view is returned for each row
+
+# due dates are stored as seconds since this date
+# ! due dates are stored to the nearest second, which is more precise than the dates shown in the app
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+def datetime_to_seconds(date: datetime) -> int:
+    return (date - EPOCH) // ONE_SECOND
+
+def seconds_to_datetime(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+# a task whose fields are stored in a row of a TaskTable
+# subclasses Task so it has the same getters and setters, the fields are replaced with properties that use the table
+class TaskRow(Task):
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: "TaskTable", row: int):
+        self.table = table
+        self.row = row
+
+    @property
+    def id(self) -> int | None:
+        return self.table.ids[self.row]
+
+    @id.setter
+    def id(self, new_id: int | None):
+        self.table.ids[self.row] = new_id
+
+    @property
+    def title(self) -> str:
+        return self.table.titles[self.row]
+
+    @title.setter
+    def title(self, new_title: str):
+        self.table.titles[self.row] = sys.intern(new_title)
+
+    @property
+    def class_name(self) -> str:
+        return self.table.class_names[self.row]
+
+    @class_name.setter
+    def class_name(self, new_class: str):
+        self.table.class_names[self.row] = sys.intern(new_class)
+
+    @property
+    def due_date(self) -> datetime:
+        return seconds_to_datetime(self.table.due_dates[self.row])
+
+    @due_date.setter
+    def due_date(self, new_date: datetime):
+        self.table.due_dates[self.row] = datetime_to_seconds(new_date)
+
+    @property
+    def priority(self) -> TaskPriority:
+        return PRIORITIES[self.table.priorities[self.row]]
+
+    @priority.setter
+    def priority(self, new_priority: TaskPriority):
+        self.table.priorities[self.row] = int(new_priority)
+
+    @property
+    def completed(self) -> bool:
+        return self.table.completed[self.row] == 1
+
+    @completed.setter
+    def completed(self, complete: bool):
+        self.table.completed[self.row] = int(complete)
+
+# the column sorted by each sort type
+SORT_COLUMNS = {
+    SortType.NAME: "titles",
+    SortType.CLASS: "class_names",
+    SortType.DUEDATE: "due_dates",
+    SortType.PRIORITY: "priorities",
+}
+
+# stores tasks as columns, one list or array per field
+class TaskTable:
+    def __init__(self):
+        self.ids: list[int | None] = []
+        self.titles: list[str] = []
+        self.class_names: list[str] = []
+        self.due_dates = array("q")
+        self.priorities = array("b")
+        self.completed = array("b")
+
+        # ! weak references are used so row views can be freed once they are no longer used, like the tasks of a task database
+        self.views: weakref.WeakValueDictionary[int, TaskRow] = weakref.WeakValueDictionary()
+
+    # creates a table containing a list of tasks
+    @classmethod
+    def from_tasks(cls, tasks) -> "TaskTable":
+        table = cls()
+        table.extend(tasks)
+        return table
+
+    def append(self, task: Task):
+        self.ids.append(task.id)
+        self.titles.append(sys.intern(task.title))
+        self.class_names.append(sys.intern(task.class_name))
+        self.due_dates.append(datetime_to_seconds(task.due_date))
+        self.priorities.append(int(task.priority))
+        self.completed.append(int(task.completed))
+
+    def extend(self, tasks):
+        for task in tasks:
+            self.append(task)
+
+    # adds a task file record (see file_io.encode_task) without creating a Task object
+    def append_record(self, record: list, task_id: int | None = None):
+        self.ids.append(task_id)
+        self.titles.append(sys.intern(record[0]))
+        self.class_names.append(sys.intern(record[1]))
+        self.due_dates.append(datetime_to_seconds(datetime.fromisoformat(record[2])))
+        self.priorities.append(record[3])
+        self.completed.append(int(record[4]))
+
+    # returns a new table containing the rows at the given indexes, in that order
+    def select(self, rows) -> "TaskTable":
+        rows = list(rows)
+        table = TaskTable()
+        table.ids = [self.ids[row] for row in rows]
+        table.titles = [self.titles[row] for row in rows]
+        table.class_names = [self.class_names[row] for row in rows]
+        table.due_dates = array("q", (self.due_dates[row] for row in rows))
+        table.priorities = array("b", (self.priorities[row] for row in rows))
+        table.completed = array("b", (self.completed[row] for row in rows))
+        return table
+
+    # sorts the rows of the table in place by one or more sort keys
+    # the same as task_sort.sort_tasks, but the keys are read straight from the columns
+    def sort(self, keys: list[SortKey]):
+        order = list(range(len(self)))
+
+        # group neighbouring keys that sort in the same direction, then sort from the least significant group (see sort_tasks)
+        runs: list[tuple[bool, list]] = []
+        for key in keys:
+            column = getattr(self, SORT_COLUMNS[key.sort_type])
+            if runs and runs[-1][0] == key.descending:
+                runs[-1][1].append(column)
+            else:
+                runs.append((key.descending, [column]))
+
+        for descending, columns in reversed(runs):
+            if len(columns) == 1:
+                order.sort(key=columns[0].__getitem__, reverse=descending)
+            else:
+                order.sort(key=lambda row: tuple(column[row] for column in columns), reverse=descending)
+
+        sorted_table = self.select(order)
+        self.ids = sorted_table.ids
+        self.titles = sorted_table.titles
+        self.class_names = sorted_table.class_names
+        self.due_dates = sorted_table.due_dates
+        self.priorities = sorted_table.priorities
+        self.completed = sorted_table.completed
+
+        # the row views that are in use are moved with their rows, so they still show the same task
+        views = self.views
+        self.views = weakref.WeakValueDictionary()
+        for new_row, old_row in enumerate(order):
+            view = views.get(old_row)
+            if not view is None:
+                view.row = new_row
+                self.views[new_row] = view
+
+    # converts a row back into a normal Task object
+    def to_task(self, row: int) -> Task:
+        task = Task(self.titles[row], seconds_to_datetime(self.due_dates[row]), self.class_names[row], PRIORITIES[self.priorities[row]])
+        task.completed = self.completed[row] == 1
+        task.id = self.ids[row]
+        return task
+
+    def to_tasks(self) -> list[Task]:
+        return [self.to_task(row) for row in range(len(self))]
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    # returns a row view, changes made to the row are stored in the table
+    # the same view is returned for a row while it is still in use, so rows are stable when they are hashed by identity
+    def __getitem__(self, row: int) -> TaskRow:
+        # ? range check
+        if row < 0:
+            row += len(self)
+        if row < 0 or row >= len(self):
+            raise IndexError("task index out of range")
+
+        view = self.views.get(row)
+
+        if view is None:
+            view = TaskRow(self, row)
+            self.views[row] = view
+
+        return view
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+# reads an open task file into a table, one record at a time
+# version 1 files are read as Task objects first as they have no records
+def read_table(save_file) -> TaskTable:
+    header_line = save_file.readline()
+
+    if is_legacy_header(header_line):
+        return TaskTable.from_tasks(read_legacy_tasks(header_line + save_file.read()))
+
+    fields = decode_header(header_line)
+    order = [fields.index(field) for field in TASK_FIELDS]
+    in_order = order == list(range(len(TASK_FIELDS)))
+    # files saved by the app store each task's id, see journal.py
+    task_id = fields.index("id") if "id" in fields else None
+
+    table = TaskTable()
+    for line in save_file:
+        if line.isspace():
+            continue
+
+        record = json.loads(line)
+        table.append_record(record if in_order else [record[i] for i in order], None if task_id is None else record[task_id])
+
+    return table
@@ -0,0 +1,86 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+# ? Records how long the app spends in its slowest functions and writes them to a Chrome trace file,
+# ? which can be opened in chrome://tracing or https://ui.perfetto.dev
+# ? Tracing is enabled by setting the HOMEWORK_ORGANISER_TRACE environment variable to the path of the trace file,
+# ? or by running main.py with --trace <path>
+# ? Data types:
+# ?     - int: times are recorded in nanoseconds from time.perf_counter_ns(), and written in microseconds as Chrome expects
+# ?     - dict: each span is written as a Chrome "complete" event, e.g. {"name": "TaskView.redraw_list", "ph": "X", "ts": 10, "dur": 5, ...}
+# ? Data structures:
+# ?     - list[dict]: every recorded event, in the order the spans finished
+
+ENVIRONMENT_VARIABLE = "HOMEWORK_ORGANISER_TRACE"
+
+# path the trace is written to when the app exits, None if tracing is disabled
+trace_path: str | None = os.environ.get(ENVIRONMENT_VARIABLE) or None
+# ! checked when functions are decorated, so tracing must be enabled before the traced modules are imported
+enabled = not trace_path is None
+
+events: list[dict] = []
+# threads that have recorded a span, used to name each thread in the trace
+thread_names: dict[int, str] = {}
+
+# enables tracing and writes the trace to path when the app exits
+def enable(path: str):
+    global trace_path, enabled
+
+    trace_path = path
+    enabled = True
+
+# records a span that started and ended at the given perf_counter_ns() times
+def record(name: str, start: int, end: int, category: str = "function"):
+    thread_id = threading.get_ident()
+    if not thread_id in thread_names:
+        thread_names[thread_id] = threading.current_thread().name
+
+    # ! list.append is thread safe, so spans can be recorded by background threads without a lock
+    events.append({
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": start / 1000,
+        "dur": (end - start) / 1000,
+        "pid": os.getpid(),
+        "tid": thread_id,
+    })
+
+# decorator that records a span each time a function is called
+# ! when tracing is disabled the function is returned unchanged, so it costs nothing
+def traced(function):
+    if not enabled:
+        return function
+
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def traced_function(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, start, time.perf_counter_ns())
+
+    return traced_function
+
+# writes every recorded span to the trace file
+def write_trace(path: str):
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id, "args": {"name": thread_name}}
+        for thread_id, thread_name in list(thread_names.items())
+    ]
+
+    with open(path, "w", encoding="utf-8") as trace_file:
+        json.dump({"traceEvents": metadata + list(events), "displayTimeUnit": "ms"}, trace_file)
+
+# writes the trace when the app exits
+def write_trace_at_exit():
+    if enabled:
+        write_trace(trace_path)
+
+atexit.register(write_trace_at_exit)
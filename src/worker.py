@@ -0,0 +1,53 @@
+import threading
+
+from PySide6 import QtCore
+
+from file_io import Cancelled
+
+# ? Data types:
+# ?     - Worker: runs a slow function (such as loading or saving a task file) on a QThreadPool thread so the window stays responsive
+# ?     - WorkerSignals: the signals used to send the result of a Worker back to the GUI thread
+# ?     - threading.Event: used to tell a running function that it has been cancelled
+
+# QRunnable can't have signals, so they are stored on a separate QObject
+# ! signals must be connected to methods of QObjects (not lambdas) so they are run on the GUI thread
+class WorkerSignals(QtCore.QObject):
+    finished = QtCore.Signal(object)
+    failed = QtCore.Signal(object)
+    cancelled = QtCore.Signal()
+    # progress from 0 to 100
+    progress = QtCore.Signal(int)
+
+# runs a function on a thread pool thread
+# the function is passed a progress callback and a cancel event as keyword arguments
+class Worker(QtCore.QRunnable):
+    def __init__(self, function, *args):
+        super().__init__()
+
+        self.function = function
+        self.args = args
+
+        self.signals = WorkerSignals()
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            result = self.function(*self.args, progress=self.report_progress, cancel_event=self.cancel_event)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.failed.emit(error)
+        else:
+            self.signals.finished.emit(result)
+
+    # converts a fraction from 0 to 1 into a percentage for the progress signal
+    def report_progress(self, fraction: float):
+        self.signals.progress.emit(int(fraction * 100))
+
+    # asks the function to stop, it will stop the next time it checks the cancel event
+    def cancel(self):
+        self.cancel_event.set()
+
+    # starts the worker on the global thread pool
+    def start(self):
+        QtCore.QThreadPool.globalInstance().start(self)